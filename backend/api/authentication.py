@@ -0,0 +1,147 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from api.metrics import metrics
+from recipes.versions import bump_version, get_version
+
+SHARED_TOKEN_KEY = 'auth_token:{}'
+AUTH_VERSION = 'auth_user:{}'
+
+
+class TokenCache:
+    """
+    Ограниченный по размеру LRU-кэш токенов с временем жизни записей.
+    Хранит пару (пользователь, токен) в сериализованном виде,
+    чтобы каждый запрос получал собственный объект пользователя,
+    и версию доступа пользователя на момент записи.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user_id, version, data = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return user_id, version, data
+
+    def set(self, key, user, token, version, data=None):
+        if data is None:
+            data = pickle.dumps((user, token))
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL
+        with self._lock:
+            self._entries[key] = (expires, user.pk, version, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return data
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            keys = [
+                key for key, (_, entry_user_id, _, _)
+                in self._entries.items()
+                if entry_user_id == user_id
+            ]
+            for key in keys:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def get_auth_version(user_id):
+    """
+    Версия доступа пользователя в общем кэше версий. Запись кэша
+    токенов действительна, только пока версия не изменилась.
+    """
+    return get_version(AUTH_VERSION.format(user_id))
+
+
+def revoke_user_tokens(user_id):
+    """
+    Сбрасывает кэш токенов пользователя во всех процессах:
+    их записи перестают совпадать с версией доступа.
+    """
+    token_cache.delete_user(user_id)
+    transaction.on_commit(
+        lambda: bump_version(AUTH_VERSION.format(user_id))
+    )
+
+
+def invalidate_token(key):
+    token_cache.delete(key)
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        cache.delete(SHARED_TOKEN_KEY.format(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшированием пары токен → пользователь
+    в памяти процесса и, при AUTH_TOKEN_SHARED_CACHE, в общем кэше.
+    Каждое попадание сверяется с версией доступа пользователя в общем
+    кэше версий, поэтому выход, смена пароля и деактивация действуют
+    сразу во всех процессах.
+    """
+    def get_cached(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            user_id, version, data = cached
+            if version == get_auth_version(user_id):
+                return data
+            token_cache.delete(key)
+        return None
+
+    def get_shared(self, key):
+        entry = cache.get(SHARED_TOKEN_KEY.format(key))
+        if entry is None:
+            return None
+        user_id, version, data = entry
+        if version != get_auth_version(user_id):
+            return None
+        user, token = pickle.loads(data)
+        token_cache.set(key, user, token, version, data)
+        return data
+
+    def authenticate_credentials(self, key):
+        data = self.get_cached(key)
+        metrics.cache_result('auth_token', data is not None, data is None)
+        if data is not None:
+            return pickle.loads(data)
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            data = self.get_shared(key)
+            metrics.cache_result(
+                'auth_token_shared', data is not None, data is None
+            )
+            if data is not None:
+                return pickle.loads(data)
+        user, token = super().authenticate_credentials(key)
+        version = get_auth_version(user.pk)
+        data = token_cache.set(key, user, token, version)
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            cache.set(
+                SHARED_TOKEN_KEY.format(key), (user.pk, version, data),
+                settings.AUTH_TOKEN_CACHE_TTL
+            )
+        return user, token
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from api.metrics import metrics
+from recipes.versions import get_versions
+
+RECIPE_REPRESENTATION_KEY = 'recipe_representation:{}:{}:{}:{}:{}:{}'
+
+
+def get_representation_keys(request, recipes):
+    """
+    Ключи кэша представлений рецептов.
+    В ключ входят версии рецепта, его автора и справочников,
+    а также адрес сервера, от которого зависят ссылки на картинки.
+    """
+    names = {'tags', 'ingredients'}
+    for recipe in recipes:
+        names.add(f'recipe:{recipe.id}')
+        names.add(f'user:{recipe.author_id}')
+    versions = get_versions(names)
+    base_uri = request.build_absolute_uri('/') if request else ''
+    return {
+        recipe.id: RECIPE_REPRESENTATION_KEY.format(
+            base_uri,
+            recipe.id,
+            versions[f'recipe:{recipe.id}'],
+            versions[f'user:{recipe.author_id}'],
+            versions['tags'],
+            versions['ingredients'],
+        )
+        for recipe in recipes
+    }
+
+
+def get_cached_representations(keys):
+    """Представления рецептов из кэша: {recipe_id: представление}."""
+    cached = cache.get_many(keys.values())
+    metrics.cache_result(
+        'recipe_representation', len(cached), len(keys) - len(cached)
+    )
+    return {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+
+
+def cache_representations(keys, representations):
+    cache.set_many(
+        {keys[recipe_id]: data for recipe_id, data in representations.items()},
+        settings.RECIPE_REPRESENTATION_CACHE_TIMEOUT
+    )
@@ -1,6 +1,8 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import get_search_backend
 
 
 class IngredientFilter(FilterSet):
@@ -18,8 +20,11 @@ class RecipeFilter(FilterSet):
         queryset=Tag.objects.all(),
         field_name='tags__slug',
         to_field_name='slug',
-        conjoined=False,
-        lookup_expr='exact'
+        method='filter_tags'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_match'
     )
     is_favorited = filters.BooleanFilter(
         method='filter_favorited_in_shopping'
@@ -27,10 +32,48 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_favorited_in_shopping'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'tags', 'tags_match', 'is_favorited',
+            'is_in_shopping_cart', 'search'
+        )
+
+    def filter_tags(self, queryset, name, tags):
+        """
+        Рецепты с любым из тегов, а при tags_match=all — со всеми.
+        Проверка через EXISTS не размножает строки рецептов,
+        поэтому DISTINCT не нужен.
+        """
+        if not tags:
+            return queryset
+        tag_ids = {tag.id for tag in tags}
+        match_all = self.form.cleaned_data.get('tags_match') == 'all'
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if not match_all:
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag__in=tag_ids))
+            )
+        for tag_id in tag_ids:
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag=tag_id))
+            )
+        return queryset
+
+    def filter_tags_match(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, результаты упорядочены по релевантности."""
+        backend = get_search_backend()
+        if backend is None:
+            return queryset.filter(name__icontains=value)
+        return backend.search(queryset, value)
 
     def filter_favorited_in_shopping(self, queryset, name, value):
         if name == 'is_favorited':
@@ -0,0 +1,135 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from recipes.models import Ingredient
+from recipes.versions import get_versions
+
+
+class VersionedIndex:
+    """
+    Базовый индекс в памяти процесса.
+    Строится при первом обращении и перестраивается,
+    когда меняется версия одного из наборов данных version_names.
+    """
+    version_names = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+
+    def load(self):
+        """Возвращает строки из БД, по которым строится индекс."""
+        raise NotImplementedError
+
+    def build(self, rows):
+        """Строит индекс по строкам rows."""
+        raise NotImplementedError
+
+    def get_data(self):
+        version = get_versions(self.version_names)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._data = self.build(self.load())
+                    self._version = version
+        return self._data
+
+
+class IngredientIndex(VersionedIndex):
+    """Базовый индекс справочника ингредиентов."""
+    version_names = ('ingredients',)
+
+    def load(self):
+        return list(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'
+        ))
+
+
+class IngredientPrefixIndex(IngredientIndex):
+    """Индекс ингредиентов для автодополнения по началу названия."""
+    def build(self, rows):
+        rows = sorted((row['name'].lower(), row['id'], row) for row in rows)
+        return [key for key, _, _ in rows], [row for _, _, row in rows]
+
+    def search(self, query, limit):
+        """
+        Возвращает ингредиенты, название которых начинается с query,
+        а после них — ингредиенты, название которых содержит query.
+        """
+        keys, entries = self.get_data()
+        query = query.lower()
+        if not query:
+            return entries[:limit]
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(entries[position])
+            position += 1
+        if len(result) < limit:
+            for index, key in enumerate(keys):
+                if query in key and not key.startswith(query):
+                    result.append(entries[index])
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+def get_trigrams(value):
+    """
+    Множество триграмм строки по правилам pg_trgm: каждое слово
+    дополняется двумя пробелами в начале и одним в конце.
+    """
+    trigrams = set()
+    for word in re.findall(r'\w+', value.lower()):
+        word = f'  {word} '
+        trigrams.update(
+            word[index:index + 3] for index in range(len(word) - 2)
+        )
+    return trigrams
+
+
+class IngredientTrigramIndex(IngredientIndex):
+    """
+    Индекс ингредиентов для нечёткого поиска по сходству триграмм.
+    Используется, когда pg_trgm недоступен.
+    """
+    def build(self, rows):
+        entries = sorted(rows, key=lambda row: row['name'].lower())
+        sizes = []
+        postings = defaultdict(list)
+        for position, row in enumerate(entries):
+            trigrams = get_trigrams(row['name'])
+            sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(position)
+        return entries, sizes, postings
+
+    def search(self, query, limit, threshold):
+        """
+        Возвращает не больше limit ингредиентов, сходство названия
+        которых с query не меньше threshold, по убыванию сходства.
+        """
+        entries, sizes, postings = self.get_data()
+        query_trigrams = get_trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        matches = []
+        for position, common in shared.items():
+            similarity = common / (
+                len(query_trigrams) + sizes[position] - common
+            )
+            if similarity >= threshold:
+                matches.append((-similarity, position))
+        return [entries[position] for _, position in heapq.nsmallest(
+            limit, matches
+        )]
+
+
+ingredient_index = IngredientPrefixIndex()
+ingredient_trigram_index = IngredientTrigramIndex()
@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework import serializers
+
+IN_LIST = re.compile(r'\((?:%s|\?)(?:,\s*(?:%s|\?))*\)')
+NUMBER = re.compile(r'\b\d+\b')
+STRING = re.compile(r"'(?:[^']|'')*'")
+SPACES = re.compile(r'\s+')
+
+_state = threading.local()
+
+
+def fingerprint(sql):
+    """
+    Отпечаток SQL-запроса: литералы и списки параметров IN (...)
+    заменены, чтобы одинаковые по форме запросы совпадали.
+    """
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = IN_LIST.sub('(...)', sql.replace('%s', '?'))
+    return SPACES.sub(' ', sql).strip()
+
+
+def get_duplicates(queries):
+    """Отпечатки запросов, выполненных больше одного раза."""
+    counts = Counter(fingerprint(sql) for sql in queries)
+    return [
+        {'fingerprint': sql, 'count': count}
+        for sql, count in counts.most_common() if count > 1
+    ]
+
+
+def get_query_budget(view_class, action):
+    """
+    Допустимое число запросов для действия view: атрибут
+    query_budgets класса view или настройка QUERY_BUDGETS
+    для представлений сторонних пакетов.
+    """
+    budgets = getattr(view_class, 'query_budgets', None) or {}
+    if action in budgets:
+        return budgets[action]
+    return settings.QUERY_BUDGETS.get(f'{view_class.__name__}.{action}')
+
+
+def resolve_view(view_func, method):
+    """Класс и действие DRF-представления по функции из URLconf."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return None, None
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return view_class, actions.get(method.lower())
+    return view_class, method.lower()
+
+
+class QueryCollector:
+    """
+    Обёртка выполнения SQL для connection.execute_wrapper:
+    запоминает текст и длительность каждого запроса.
+    """
+    def __init__(self):
+        self.queries = []
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries.append(sql)
+
+
+@contextmanager
+def serializer_timer():
+    """
+    Считает суммарное время получения serializer.data за время
+    блока. Вложенные сериализаторы не учитываются повторно.
+    """
+    timer = {'depth': 0, 'duration': 0.0}
+    _state.timer = timer
+    try:
+        yield timer
+    finally:
+        _state.timer = None
+
+
+def timed_data(getter):
+    def data(self):
+        timer = getattr(_state, 'timer', None)
+        if timer is None:
+            return getter(self)
+        timer['depth'] += 1
+        start = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            timer['depth'] -= 1
+            if not timer['depth']:
+                timer['duration'] += time.perf_counter() - start
+    return data
+
+
+def install_serializer_timing():
+    """
+    Подменяет свойство data у сериализаторов DRF на версию
+    с замером времени. Вызывается только при включённой
+    инструментации, поэтому без неё накладных расходов нет.
+    """
+    for serializer_class in (serializers.Serializer,
+                             serializers.ListSerializer):
+        if not getattr(serializer_class.data.fget, 'instrumented', False):
+            data = timed_data(serializer_class.data.fget)
+            data.instrumented = True
+            serializer_class.data = property(data)
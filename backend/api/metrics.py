@@ -0,0 +1,344 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Количество обработанных запросов', None
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса', LATENCY_BUCKETS
+    ),
+    'foodgram_db_queries_per_request': (
+        'histogram', 'Количество SQL-запросов на один запрос', QUERY_BUCKETS
+    ),
+    'foodgram_http_response_size_bytes': (
+        'summary', 'Размер тела ответа', None
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кэшам по результату', None
+    ),
+    'foodgram_db_connections_opened_total': (
+        'counter', 'Открыто соединений с БД', None
+    ),
+    'foodgram_db_pool_size': (
+        'gauge', 'Размер пула соединений, сумма по процессам', None
+    ),
+    'foodgram_db_pool_connections': (
+        'gauge', 'Соединения пула по состоянию', None
+    ),
+    'foodgram_db_pool_wait_seconds': (
+        'histogram', 'Ожидание соединения из пула', LATENCY_BUCKETS
+    ),
+    'foodgram_db_pool_timeouts_total': (
+        'counter', 'Не дождались соединения из пула', None
+    ),
+}
+GAUGES = {name for name, (kind, _, _) in METRICS.items() if kind == 'gauge'}
+# Файл, в который сводятся значения завершившихся процессов.
+ARCHIVE_NAME = 'archive.json'
+# Сколько имён сведённых файлов помнит архив: процесс, прочитавший
+# файл до его удаления, не должен учесть его значения дважды.
+ARCHIVE_HISTORY = 1000
+
+
+def get_labels(labels):
+    """Метки в виде отсортированного кортежа строковых пар."""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса. Значения хранятся по ключу
+    (метрика, метки); у гистограммы — счётчики по корзинам, сумма
+    и количество. При заданном METRICS_DIR процесс периодически
+    сохраняет значения в свой файл, а выгрузка суммирует файлы
+    всех процессов gunicorn.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._last_flush = 0.0
+        self._path = None
+
+    @property
+    def enabled(self):
+        return settings.METRICS_ENABLED
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, get_labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[(name, get_labels(labels))] = value
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        kind, _, buckets = METRICS[name]
+        key = (name, get_labels(labels))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {
+                    'buckets': [0] * len(buckets or ()), 'sum': 0, 'count': 0
+                }
+            if buckets:
+                position = bisect_left(buckets, value)
+                if position < len(buckets):
+                    entry['buckets'][position] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+        self.maybe_flush()
+
+    def cache_result(self, cache_name, hits, misses):
+        """Учитывает попадания и промахи кэша cache_name."""
+        if hits:
+            self.inc('foodgram_cache_requests_total', hits,
+                     cache=cache_name, result='hit')
+        if misses:
+            self.inc('foodgram_cache_requests_total', misses,
+                     cache=cache_name, result='miss')
+
+    def get_path(self):
+        if self._path is None:
+            self._path = os.path.join(
+                settings.METRICS_DIR,
+                f'metrics_{os.getpid()}_{time.time_ns()}.json'
+            )
+            atexit.register(self.flush)
+        return self._path
+
+    def maybe_flush(self):
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Атомарно записывает значения процесса в его файл."""
+        if not settings.METRICS_DIR:
+            return
+        with self._lock:
+            self._last_flush = time.monotonic()
+            content = json.dumps([
+                [name, labels, value]
+                for (name, labels), value in self._values.items()
+            ])
+        path = self.get_path()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Значения всех процессов: {(метрика, метки): значение}."""
+        if not settings.METRICS_DIR:
+            with self._lock:
+                return {
+                    key: (dict(value, buckets=list(value['buckets']))
+                          if isinstance(value, dict) else value)
+                    for key, value in self._values.items()
+                }
+        self.flush()
+        processes = {}
+        pattern = os.path.join(settings.METRICS_DIR, 'metrics_*.json')
+        for path in glob.glob(pattern):
+            rows = read_rows(path)
+            if rows is not None:
+                processes[os.path.basename(path)] = (is_alive(path), rows)
+        # Архив читается после файлов процессов: файл удаляется только
+        # после того, как его значения попали в архив.
+        archive = read_archive(settings.METRICS_DIR)
+        values = {}
+        for name, labels, value in archive['rows']:
+            merge_value(values, (name, get_labels(dict(labels))), value)
+        for filename, (alive, rows) in processes.items():
+            if filename in archive['merged']:
+                continue
+            for name, labels, value in rows:
+                # Текущие значения завершившихся процессов не учитываются,
+                # накопленные счётчики и гистограммы — учитываются.
+                if name in GAUGES and not alive:
+                    continue
+                key = (name, get_labels(dict(labels)))
+                merge_value(values, key, value)
+        return values
+
+    def render(self):
+        """Значения в текстовом формате экспозиции Prometheus."""
+        values = self.collect()
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            samples = sorted(
+                ((labels, value) for (metric, labels), value in values.items()
+                 if metric == name),
+                key=lambda sample: sample[0]
+            )
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                if kind in ('counter', 'gauge'):
+                    lines.append(
+                        f'{name}{format_labels(labels)} {format_value(value)}'
+                    )
+                    continue
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(buckets, value['buckets']):
+                        cumulative += count
+                        bucket_labels = labels + (('le', format_value(bound)),)
+                        lines.append(
+                            f'{name}_bucket{format_labels(bucket_labels)} '
+                            f'{cumulative}'
+                        )
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{format_labels(labels + (("le", "+Inf"),))} '
+                        f'{value["count"]}'
+                    )
+                lines.append(
+                    f'{name}_sum{format_labels(labels)} '
+                    f'{format_value(value["sum"])}'
+                )
+                lines.append(
+                    f'{name}_count{format_labels(labels)} {value["count"]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def is_alive(path):
+    """Жив ли процесс, записавший файл metrics_{pid}_{время}.json."""
+    pid = int(os.path.basename(path).split('_')[1])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_rows(path):
+    """Строки файла метрик или None, если файл не прочитать."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def read_archive(directory):
+    """Сведённые значения завершившихся процессов."""
+    archive = read_rows(os.path.join(directory, ARCHIVE_NAME))
+    if archive is None:
+        return {'merged': [], 'rows': []}
+    return archive
+
+
+def archive_process(directory, pid):
+    """
+    Сводит счётчики и гистограммы завершившегося процесса в архив
+    и удаляет его файлы. Текущие значения (gauge) отбрасываются.
+    Вызывается одним процессом — мастером gunicorn.
+    """
+    paths = glob.glob(os.path.join(directory, f'metrics_{pid}_*'))
+    if not paths:
+        return
+    archive = read_archive(directory)
+    values = {}
+    for name, labels, value in archive['rows']:
+        merge_value(values, (name, get_labels(dict(labels))), value)
+    merged = []
+    for path in paths:
+        rows = read_rows(path) if path.endswith('.json') else None
+        if rows is None:
+            continue
+        merged.append(os.path.basename(path))
+        for name, labels, value in rows:
+            if name not in GAUGES:
+                merge_value(values, (name, get_labels(dict(labels))), value)
+    path = os.path.join(directory, ARCHIVE_NAME)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({
+            'merged': (archive['merged'] + merged)[-ARCHIVE_HISTORY:],
+            'rows': [
+                [name, labels, value]
+                for (name, labels), value in values.items()
+            ],
+        }, file)
+    os.replace(tmp_path, path)
+    for path in paths:
+        remove_file(path)
+
+
+def clear_metrics(directory):
+    """Удаляет файлы метрик прошлого запуска."""
+    for path in glob.glob(os.path.join(directory, 'metrics_*')):
+        remove_file(path)
+    for path in glob.glob(os.path.join(directory, f'{ARCHIVE_NAME}*')):
+        remove_file(path)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def merge_value(values, key, value):
+    current = values.get(key)
+    if current is None:
+        values[key] = value
+    elif isinstance(value, dict):
+        current['buckets'] = [
+            left + right
+            for left, right in zip(current['buckets'], value['buckets'])
+        ]
+        current['sum'] += value['sum']
+        current['count'] += value['count']
+    else:
+        values[key] = current + value
+
+
+metrics = MetricsRegistry()
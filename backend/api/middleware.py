@@ -0,0 +1,158 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api.instrumentation import (QueryCollector, get_duplicates,
+                                 get_query_budget, install_serializer_timing,
+                                 resolve_view, serializer_timer)
+from api.metrics import metrics
+from api.slow_queries import set_current_view
+
+logger = logging.getLogger(__name__)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Для каждого запроса считает число SQL-запросов, время в БД,
+    повторяющиеся запросы и время сериализации, добавляет заголовок
+    Server-Timing и пишет строку лога в JSON.
+    Включается настройкой QUERY_INSTRUMENTATION, без неё
+    Django исключает middleware из цепочки.
+    """
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        install_serializer_timing()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.instrumented_view = (None, None)
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with serializer_timer() as timer:
+            with connection.execute_wrapper(collector):
+                response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        view_class, action = request.instrumented_view
+        view_name = (
+            f'{view_class.__name__}.{action}' if view_class else None
+        )
+        budget = (
+            get_query_budget(view_class, action) if view_class else None
+        )
+        queries = len(collector.queries)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={collector.duration * 1000:.1f};desc="{queries} queries"',
+            f'serializer;dur={timer["duration"] * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': queries,
+            'query_budget': budget,
+            'db_ms': round(collector.duration * 1000, 2),
+            'serializer_ms': round(timer['duration'] * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': get_duplicates(collector.queries),
+        }
+        if budget is not None and queries > budget:
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.instrumented_view = resolve_view(view_func, request.method)
+
+
+class QueryCounter:
+    """Обёртка выполнения SQL, которая только считает запросы."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запросов с метками маршрута и действия DRF:
+    время обработки, количество SQL-запросов и размер ответа.
+    Включается настройкой METRICS_ENABLED.
+    """
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_labels = None
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        labels = request.metrics_labels or {
+            'route': 'unmatched', 'action': ''
+        }
+        labels['method'] = request.method
+        metrics.inc(
+            'foodgram_http_requests_total',
+            status=response.status_code, **labels
+        )
+        metrics.observe(
+            'foodgram_http_request_duration_seconds', duration, **labels
+        )
+        metrics.observe(
+            'foodgram_db_queries_per_request', counter.count, **labels
+        )
+        if not response.streaming:
+            metrics.observe(
+                'foodgram_http_response_size_bytes',
+                len(response.content), **labels
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _, action = resolve_view(view_func, request.method)
+        request.metrics_labels = {
+            'route': request.resolver_match.url_name
+            or request.resolver_match.view_name,
+            'action': action or '',
+        }
+
+
+class SlowQueryMiddleware:
+    """
+    Запоминает представление текущего запроса, чтобы журнал
+    медленных запросов указывал, откуда они выполнены.
+    Включается настройкой SLOW_QUERY_LOG.
+    """
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        set_current_view(None)
+        try:
+            return self.get_response(request)
+        finally:
+            set_current_view(None)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class, action = resolve_view(view_func, request.method)
+        set_current_view(
+            f'{view_class.__name__}.{action}' if view_class
+            else request.resolver_match.view_name
+        )
@@ -1,5 +1,156 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(BasePagination):
+    """
+    Keyset-пагинация рецептов по паре (pub_date, id).
+    Не выполняет COUNT(*) и OFFSET, поэтому стоимость запроса
+    не зависит от глубины страницы.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        return min(max(page_size, 1), settings.CURSOR_PAGINATION_MAX_LIMIT)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position = (parse_datetime(cursor['p']), int(cursor['i']))
+            reverse = bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        pub_date, pk = position
+        cursor = {'p': pub_date.isoformat(), 'i': pk}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode())
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode()
+        )
+
+    def filter_position(self, queryset, position, reverse, id_field='id'):
+        """Упорядочивает queryset и оставляет строки после позиции курсора."""
+        if reverse:
+            queryset = queryset.order_by('pub_date', id_field)
+        else:
+            queryset = queryset.order_by('-pub_date', f'-{id_field}')
+        if position is not None:
+            pub_date, pk = position
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'pub_date__{lookup}': pub_date})
+                | Q(pub_date=pub_date, **{f'{id_field}__{lookup}': pk})
+            )
+        return queryset
+
+    def set_links(self, positions, has_more, position, reverse):
+        """Формирует ссылки next/previous по позициям строк страницы."""
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else position is not None
+        self.next = None
+        self.previous = None
+        if positions and has_next:
+            self.next = self.encode_cursor(positions[-1], reverse=False)
+        if positions and has_previous:
+            self.previous = self.encode_cursor(positions[0], reverse=True)
+        elif has_previous:
+            self.previous = remove_query_param(
+                self.base_url, self.cursor_query_param
+            )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        queryset = self.filter_position(queryset, position, reverse)
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.set_links(
+            [(recipe.pub_date, recipe.id) for recipe in results],
+            has_more, position, reverse
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next),
+            ('previous', self.previous),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """
+    Keyset-пагинация ленты, собранной из нескольких источников.
+    Каждый источник — queryset с полем pub_date и полем id рецепта.
+    Из каждого берётся не больше страницы строк после курсора,
+    затем строки сливаются в общем порядке без повторов.
+    """
+    def paginate_sources(self, sources, request):
+        """
+        sources — список пар (queryset, поле id рецепта).
+        Возвращает список пар (pub_date, id рецепта) для страницы.
+        """
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        rows = set()
+        for queryset, id_field in sources:
+            queryset = self.filter_position(
+                queryset, position, reverse, id_field
+            )
+            rows.update(
+                queryset.values_list('pub_date', id_field)[:page_size + 1]
+            )
+        rows = sorted(rows, reverse=not reverse)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        self.set_links(rows, has_more, position, reverse)
+        return rows
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -5,3 +7,19 @@ class IsAuthorOrReadOnly(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         return obj.author == request.user or request.method in SAFE_METHODS
+
+
+class IsMetricsScraper(BasePermission):
+    """
+    Доступ к метрикам: администраторам или сборщику метрик
+    с заголовком Authorization: Bearer METRICS_TOKEN.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        header = request.headers.get('Authorization', '')
+        return bool(token) and constant_time_compare(
+            header, f'Bearer {token}'
+        )
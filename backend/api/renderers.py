@@ -0,0 +1,45 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class MetricsRenderer(BaseRenderer):
+    """Текстовый формат экспозиции метрик Prometheus."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode()
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Рендерер форматов выгрузки списка покупок.
+    Сам файл отдаётся потоком из представления,
+    через рендерер проходят только сообщения об ошибках.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class PlainTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
@@ -1,7 +1,11 @@
 import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.db import transaction
+from django.db.models import Manager, Prefetch
 
 from djoser.serializers import UserCreateSerializer as DjoserUserSerialiser
 from djoser.serializers import UserSerializer
@@ -9,9 +13,15 @@ from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.images import enqueue_image_processing
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.search import update_search_index
+from recipes.shopping_list import change_recipe_in_shopping_lists
 
+from api.cache import (cache_representations, get_cached_representations,
+                       get_representation_keys)
+from api.utils import get_recipes_limit
 from users.models import Follow, User
 
 # -----------------------------------------------------------------------------
@@ -35,6 +45,63 @@ class UsersCreateSerializer(DjoserUserSerialiser):
         )
 
 
+def is_subscribed(context, author_id):
+    """
+    Подписан ли текущий пользователь на автора.
+    Использует подписки, загруженные списочным сериализатором,
+    и обращается к БД, только если автора среди них нет.
+    """
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return False
+    if author_id in context.get('checked_author_ids', ()):
+        return author_id in context['subscribed_ids']
+    return Follow.objects.filter(
+        user=request.user, author_id=author_id
+    ).exists()
+
+
+class SubscribedAuthorsListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор, который одним запросом определяет,
+    на каких авторов страницы подписан текущий пользователь.
+    Результат сохраняется в контексте и используется всеми
+    вложенными сериализаторами пользователей.
+    """
+    def get_author_id(self, obj):
+        return obj.id
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        data = list(data)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            author_ids = {self.get_author_id(obj) for obj in data}
+            subscribed_ids = self.context.setdefault(
+                'subscribed_ids', set()
+            )
+            checked_ids = self.context.setdefault(
+                'checked_author_ids', set()
+            )
+            unchecked_ids = author_ids - checked_ids
+            if unchecked_ids:
+                subscribed_ids.update(Follow.objects.filter(
+                    user=request.user, author_id__in=unchecked_ids
+                ).values_list('author_id', flat=True))
+                checked_ids.update(unchecked_ids)
+        return super().to_representation(data)
+
+
+class RecipeAuthorsListSerializer(SubscribedAuthorsListSerializer):
+    """
+    Списочный сериализатор рецептов с пакетной проверкой
+    подписки на их авторов.
+    """
+    def get_author_id(self, obj):
+        return obj.author_id
+
+
 class UserGetSerializer(UserSerializer):
     """
     Сериализатор для отображения информации о пользователе.
@@ -51,13 +118,12 @@ class UserGetSerializer(UserSerializer):
             'last_name',
             'is_subscribed'
         )
+        list_serializer_class = SubscribedAuthorsListSerializer
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return (request.user.is_authenticated
-                and Follow.objects.filter(
-                    user=request.user, author=obj
-                ).exists())
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return is_subscribed(self.context, obj.id)
 
 
 class UserSubscribeSerializer(serializers.ModelSerializer):
@@ -98,16 +164,65 @@ class UserSubscribeSerializer(serializers.ModelSerializer):
 class Base64ImageField(serializers.ImageField):
     """
     Кастомное поле для кодирования изображения в base64.
+    Картинка декодируется порциями во временный файл.
     """
+    default_error_messages = {
+        'invalid_base64': 'Некорректное изображение в формате base64.',
+        'invalid_format': 'Недопустимый формат изображения: {ext}.',
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+    }
+
+    def decode_to_file(self, data):
+        header, sep, imgstr = data.partition(';base64,')
+        ext = header.split('/')[-1].lower()
+        if not sep:
+            self.fail('invalid_base64')
+        if ext not in settings.RECIPE_IMAGE_FORMATS:
+            self.fail('invalid_format', ext=ext)
+        size = len(imgstr) * 3 // 4
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        image_file = TemporaryUploadedFile(
+            'photo.' + ext, f'image/{ext}', size, None
+        )
+        chunk_size = settings.RECIPE_IMAGE_DECODE_CHUNK
+        try:
+            for start in range(0, len(imgstr), chunk_size):
+                image_file.write(base64.b64decode(
+                    imgstr[start:start + chunk_size], validate=True
+                ))
+        except binascii.Error:
+            image_file.close()
+            self.fail('invalid_base64')
+        image_file.size = image_file.tell()
+        image_file.seek(0)
+        return image_file
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='photo.' + ext)
+            data = self.decode_to_file(data)
 
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Поле со ссылками на уменьшенные копии картинки.
+    Пустое, пока копии не подготовлены.
+    """
+    def to_representation(self, value):
+        request = self.context.get('request')
+        variants = {}
+        for size_name, formats in value.items():
+            variants[size_name] = {}
+            for format_name, path in formats.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[size_name][format_name] = url
+        return variants
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с тегами."""
     class Meta:
@@ -129,7 +244,6 @@ class UserSubscribeRepresentSerializer(UserGetSerializer):
     """
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -143,6 +257,7 @@ class UserSubscribeRepresentSerializer(UserGetSerializer):
             'recipes',
             'recipes_count'
         )
+        list_serializer_class = SubscribedAuthorsListSerializer
         read_only_fields = (
             'email',
             'username',
@@ -155,21 +270,20 @@ class UserSubscribeRepresentSerializer(UserGetSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes_limit = None
-        if request:
-            recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = obj.recipes.all()[:int(recipes_limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            recipes_limit = None
+            if request:
+                recipes_limit = get_recipes_limit(request)
+            recipes = obj.recipes.all()[:recipes_limit]
         return ShortRecipeInfoSerializer(
             recipes,
             many=True,
             context={'request': request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """
@@ -198,6 +312,50 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class CachedRecipeListSerializer(RecipeAuthorsListSerializer):
+    """
+    Списочный сериализатор рецептов с кэшем представлений.
+    Из кэша берётся общее для всех пользователей представление,
+    поля текущего пользователя подставляются поверх него.
+    Рецепты, которых нет в кэше, загружаются одним запросом
+    вместе со связанными данными.
+    """
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        data = list(data)
+        if not settings.RECIPE_REPRESENTATION_CACHE:
+            return super().to_representation(data)
+        keys = get_representation_keys(self.context.get('request'), data)
+        cached = get_cached_representations(keys)
+        self.context['cached_recipes'] = cached
+        self.context['new_recipes'] = {}
+        missing_ids = [recipe.id for recipe in data if recipe.id not in cached]
+        if missing_ids:
+            full_recipes = Recipe.objects.defer(
+                'search_vector'
+            ).select_related('author').prefetch_related(
+                Prefetch(
+                    'recipe_ingredient',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+                'tags'
+            ).in_bulk(missing_ids)
+            for index, recipe in enumerate(data):
+                full_recipe = full_recipes.get(recipe.id)
+                if full_recipe is None:
+                    continue
+                for field in FullRecipeInfoSerializer.personal_fields:
+                    if hasattr(recipe, field):
+                        setattr(full_recipe, field, getattr(recipe, field))
+                data[index] = full_recipe
+        representation = super().to_representation(data)
+        cache_representations(keys, self.context.pop('new_recipes'))
+        return representation
+
+
 class FullRecipeInfoSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения полной информации."""
     author = UserGetSerializer(read_only=True)
@@ -207,9 +365,12 @@ class FullRecipeInfoSerializer(serializers.ModelSerializer):
         many=True,
         source='recipe_ingredient'
     )
-    is_favorited = serializers.BooleanField(read_only=True)
-    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = serializers.BooleanField(
+        read_only=True, default=False
+    )
     image = Base64ImageField(required=False)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -222,16 +383,49 @@ class FullRecipeInfoSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
+        list_serializer_class = CachedRecipeListSerializer
+
+    personal_fields = ('is_favorited', 'is_in_shopping_cart')
+
+    def to_representation(self, instance):
+        cached = self.context.get('cached_recipes', {}).get(instance.id)
+        if cached is None:
+            data = super().to_representation(instance)
+            if 'new_recipes' in self.context:
+                self.context['new_recipes'][instance.id] = (
+                    self.get_base_representation(data)
+                )
+            return data
+        data = cached.copy()
+        data['author'] = cached['author'].copy()
+        for field in self.personal_fields:
+            data[field] = bool(getattr(instance, field, False))
+        data['author']['is_subscribed'] = is_subscribed(
+            self.context, instance.author_id
+        )
+        return data
+
+    def get_base_representation(self, data):
+        """Представление рецепта для анонимного пользователя."""
+        data = data.copy()
+        data['author'] = data['author'].copy()
+        for field in self.personal_fields:
+            data[field] = False
+        data['author']['is_subscribed'] = False
+        return data
 
 
 class ShortRecipeInfoSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения краткой информации."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -293,25 +487,97 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=user, **validated_data)
         recipe.tags.set(tags)
         self.add_ingredients(ingredients, recipe)
+        update_search_index([recipe.id])
+        enqueue_image_processing(recipe)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Метод обновления ингредиентов по разнице с текущим составом:
+        добавляются новые, изменяется количество у изменённых
+        и удаляются исключённые строки рецепта.
+        Возвращает прежний и новый составы рецепта.
+        """
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in existing.items()
+        }
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        to_create = []
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = existing.get(ingredient_id)
+            if recipe_ingredient is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                ))
+            elif recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        to_delete = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id not in new_amounts
+        ]
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.tags.clear()
         instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
+        old_amounts, new_amounts = self.update_ingredients(
+            ingredients, instance
+        )
         super().update(instance, validated_data)
-        self.add_ingredients(ingredients, instance)
-        instance.save()
+        update_search_index([instance.id])
+        change_recipe_in_shopping_lists(instance.id, old_amounts, new_amounts)
+        if 'image' in validated_data:
+            enqueue_image_processing(instance)
         return instance
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if isinstance(image, TemporaryUploadedFile):
+                image.close()
+
     def to_representation(self, instance):
         context = {'request': self.context.get('request')}
         return FullRecipeInfoSerializer(instance, context=context).data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Сериализатор списка id рецептов для массового
+    добавления/удаления в избранное и список покупок.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX_IDS
+    )
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     """
     Сериализатор добавления/удаления рецепта в избранное.
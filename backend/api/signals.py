@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token, revoke_user_tokens
+from api.slow_queries import install_slow_query_logger
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Выход пользователя удаляет его токен."""
+    invalidate_token(instance.key)
+    revoke_user_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields, **kwargs):
+    """Смена пароля и деактивация сохраняют пользователя."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(connection_created)
+def log_slow_queries(sender, connection, **kwargs):
+    if settings.SLOW_QUERY_LOG:
+        install_slow_query_logger(connection)
@@ -0,0 +1,107 @@
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.instrumentation import fingerprint
+
+_state = threading.local()
+_write_lock = threading.Lock()
+
+
+def set_current_view(view):
+    """Представление, от имени которого выполняются запросы потока."""
+    _state.view = view
+
+
+def get_current_view():
+    return getattr(_state, 'view', None)
+
+
+def explain(connection, sql, params):
+    """
+    План выполнения запроса. На PostgreSQL — EXPLAIN (ANALYZE, BUFFERS),
+    запрос при этом выполняется повторно, поэтому внутри транзакции
+    он обёрнут в точку сохранения с откатом. На SQLite — EXPLAIN
+    QUERY PLAN. Запрос идёт через курсор драйвера, минуя обёртки
+    выполнения, чтобы не попасть в журнал повторно.
+    """
+    options = {}
+    if connection.vendor == 'postgresql':
+        options = {'analyze': True, 'buffers': True}
+    prefix = connection.ops.explain_query_prefix(**options)
+    savepoint = bool(options) and connection.in_atomic_block
+    cursor = connection.create_cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+        finally:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cursor.close()
+    return [' '.join(str(column) for column in row) for row in rows]
+
+
+def write_record(record):
+    """Дописывает запись строкой JSON в файл SLOW_QUERY_LOG."""
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _write_lock:
+        with open(settings.SLOW_QUERY_LOG, 'a', encoding='utf-8') as file:
+            file.write(line)
+
+
+class SlowQueryLogger:
+    """
+    Обёртка выполнения SQL, которая пишет в журнал запросы дольше
+    SLOW_QUERY_THRESHOLD_MS с отпечатком и представлением. Для доли
+    SLOW_QUERY_EXPLAIN_RATE медленных SELECT сохраняется план.
+    Параметры запросов в журнал не попадают.
+    """
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.log(context['connection'], sql, params, many, duration)
+        return result
+
+    def log(self, connection, sql, params, many, duration):
+        record = {
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration, 2),
+            'fingerprint': fingerprint(sql),
+            'view': get_current_view(),
+            'database': connection.vendor,
+        }
+        if (
+            not many
+            and sql.lstrip()[:6].upper() == 'SELECT'
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+        ):
+            try:
+                record['plan'] = explain(connection, sql, params)
+            except connection.Database.Error as error:
+                record['plan_error'] = str(error)
+        write_record(record)
+
+
+slow_query_logger = SlowQueryLogger()
+
+
+def install_slow_query_logger(connection):
+    """
+    Подключает журнал к соединению. Список обёрток принадлежит
+    объекту соединения и переживает переподключения, поэтому
+    обёртка добавляется один раз. Она ставится первой: временные
+    обёртки execute_wrapper() снимаются с конца списка.
+    """
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_logger)
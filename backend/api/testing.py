@@ -0,0 +1,47 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from api.instrumentation import get_duplicates, get_query_budget, resolve_view
+
+SAVEPOINT_STATEMENTS = (
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'
+)
+
+
+def assert_query_budget(client, method, path, **kwargs):
+    """
+    Выполняет запрос тестовым клиентом и падает с AssertionError,
+    если число SQL-запросов больше бюджета, объявленного для
+    действия view, или бюджет не объявлен.
+    Возвращает ответ, чтобы тест мог проверить его содержимое.
+    """
+    view_class, action = resolve_view(
+        resolve(path.split('?')[0]).func, method
+    )
+    budget = get_query_budget(view_class, action) if view_class else None
+    if budget is None:
+        raise AssertionError(
+            f'Для {method.upper()} {path} не объявлен бюджет запросов'
+        )
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method.lower())(path, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    # Точки сохранения создаёт TestCase, который оборачивает тест
+    # в транзакцию: при обработке настоящего запроса их нет.
+    queries = [
+        query['sql'] for query in context.captured_queries
+        if not query['sql'].startswith(SAVEPOINT_STATEMENTS)
+    ]
+    if len(queries) > budget:
+        duplicates = '\n'.join(
+            f'{item["count"]} x {item["fingerprint"]}'
+            for item in get_duplicates(queries)
+        )
+        raise AssertionError(
+            f'{method.upper()} {path}: {len(queries)} запросов '
+            f'при бюджете {budget} ({view_class.__name__}.{action})'
+            + (f'\nПовторяющиеся запросы:\n{duplicates}' if duplicates else '')
+        )
+    return response
@@ -0,0 +1,489 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import AUTH_VERSION, token_cache
+from api.metrics import archive_process, clear_metrics, metrics
+from api.testing import assert_query_budget
+from recipes.models import (Favorite, FeedEntry, FeedRefillTask, Ingredient,
+                            Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.search import get_search_backend
+from recipes.shopping_list import get_live_shopping_list
+from recipes.versions import bump_version
+from users.models import Follow, User
+
+
+def create_recipes(authors, tags, ingredients, count):
+    """Рецепты авторов по кругу, с тегами и ингредиентами."""
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[number % len(authors)], name=f'Рецепт {number}',
+            text='Описание', cooking_time=5
+        )
+        recipe.tags.set(tags[:number % len(tags) + 1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class APITestCase(TestCase):
+    """Пользователи, теги, ингредиенты и рецепты для тестов API."""
+    recipes_count = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(10)
+        ]
+        cls.users = [
+            User.objects.create(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(5)
+        ]
+        cls.user = cls.users[0]
+        cls.recipes = create_recipes(
+            cls.users[1:], cls.tags, cls.ingredients, cls.recipes_count
+        )
+        for author in cls.users[1:3]:
+            Follow.objects.create(user=cls.user, author=author)
+        for recipe in cls.recipes[:2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        # Бюджеты запросов рассчитаны на холодные кэши.
+        caches['default'].clear()
+        caches['versions'].clear()
+        token_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def assert_shopping_list(self, user):
+        """Сохранённый список покупок совпадает с посчитанным по корзине."""
+        self.assertEqual(
+            dict(ShoppingListItem.objects.filter(user=user).values_list(
+                'ingredient_id', 'total_amount'
+            )),
+            get_live_shopping_list(user.id)
+        )
+
+
+class QueryBudgetTests(APITestCase):
+    """Число SQL-запросов каждого действия не превышает его бюджет."""
+
+    def assert_budget(self, method, path, status_code, **kwargs):
+        response = assert_query_budget(self.client, method, path, **kwargs)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_recipes(self):
+        recipe = self.recipes[-1]
+        self.assert_budget('get', '/api/recipes/', 200)
+        self.assert_budget('get', f'/api/recipes/{recipe.id}/', 200)
+        self.assert_budget('get', '/api/recipes/feed/', 200)
+        self.assert_budget(
+            'get', '/api/recipes/download_shopping_cart/', 200
+        )
+
+    def test_favorite(self):
+        path = f'/api/recipes/{self.recipes[-1].id}/favorite/'
+        self.assert_budget('post', path, 201)
+        self.assert_budget('delete', path, 204)
+
+    def test_shopping_cart(self):
+        path = f'/api/recipes/{self.recipes[-1].id}/shopping_cart/'
+        self.assert_budget('post', path, 201)
+        self.assert_budget('delete', path, 204)
+
+    def test_bulk(self):
+        data = {'ids': [recipe.id for recipe in self.recipes]}
+        for path in ('/api/recipes/favorite/bulk/',
+                     '/api/recipes/shopping_cart/bulk/'):
+            self.assert_budget('post', path, 200, data=data, format='json')
+            self.assert_budget('delete', path, 200, data=data, format='json')
+
+    def test_catalogs(self):
+        self.assert_budget('get', '/api/ingredients/', 200)
+        self.assert_budget(
+            'get', f'/api/ingredients/{self.ingredients[0].id}/', 200
+        )
+        self.assert_budget('get', '/api/tags/', 200)
+        self.assert_budget('get', f'/api/tags/{self.tags[0].id}/', 200)
+
+    def test_users(self):
+        self.assert_budget('get', '/api/users/', 200)
+        self.assert_budget('get', f'/api/users/{self.users[1].id}/', 200)
+        self.assert_budget('get', '/api/users/me/', 200)
+
+    def test_subscriptions(self):
+        path = f'/api/users/{self.users[3].id}/subscribe/'
+        self.assert_budget('get', '/api/users/subscriptions/', 200)
+        self.assert_budget('post', path, 201)
+        self.assert_budget('delete', path, 204)
+
+
+class RecipeListQueriesTests(APITestCase):
+    """
+    Число SQL-запросов списка рецептов не зависит от размера страницы:
+    связанные объекты загружаются пакетно, а не для каждого рецепта.
+    """
+    recipes_count = 500
+
+    def assert_page_queries(self, client, expected):
+        for limit in (6, 50, 500):
+            with self.subTest(limit=limit):
+                caches['default'].clear()
+                caches['versions'].clear()
+                with self.assertNumQueries(expected):
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_page_queries(APIClient(), 5)
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_page_queries(client, 6)
+
+
+class TokenCacheTests(APITestCase):
+    """
+    Отзыв доступа в одном процессе действует в остальных, хотя
+    их кэши токенов в памяти он не очищает.
+    """
+
+    def revoke_in_other_process(self):
+        """Деактивация без сигналов, как в другом процессе gunicorn."""
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        bump_version(AUTH_VERSION.format(self.user.pk))
+
+    def test_local_hit_is_checked(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.revoke_in_other_process()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(AUTH_TOKEN_SHARED_CACHE=True)
+    def test_shared_hit_is_checked(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        token_cache.clear()
+        self.revoke_in_other_process()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_logout(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivation(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+@override_settings(
+    FEED_POPULAR_AUTHOR_FOLLOWERS=2, FEED_REGULAR_AUTHOR_FOLLOWERS=2
+)
+class FeedTests(APITestCase):
+    """Лента подписок при смене популярности автора."""
+
+    def get_feed(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/recipes/feed/?limit=50')
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_popular_author_recipes_reach_feed_after_refill(self):
+        author = self.users[4]
+        followers = self.users[:4]
+        for follower in followers[1:]:
+            Follow.objects.create(user=follower, author=author)
+        author.refresh_from_db()
+        self.assertTrue(author.is_popular)
+        # Рецепт и подписка, пока автор популярен, в ленты не попадают.
+        recipe = create_recipes([author], self.tags, self.ingredients, 1)[0]
+        Follow.objects.create(user=followers[0], author=author)
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+
+        Follow.objects.filter(
+            author=author, user__in=followers[1:]
+        ).delete()
+        author.refresh_from_db()
+        # Флаг снимает обработчик очереди, до этого рецепты читаются
+        # из таблицы рецептов.
+        self.assertTrue(author.is_popular)
+        self.assertTrue(FeedRefillTask.objects.filter(author=author).exists())
+        self.assertIn(recipe.id, self.get_feed(followers[0]))
+
+        call_command('process_feed_tasks', once=True, stdout=None)
+        author.refresh_from_db()
+        self.assertFalse(author.is_popular)
+        self.assertFalse(FeedRefillTask.objects.exists())
+        author_recipes = set(
+            Recipe.objects.filter(author=author).values_list('id', flat=True)
+        )
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=followers[0], recipe__author=author
+            ).values_list('recipe_id', flat=True)),
+            author_recipes
+        )
+        self.assertLessEqual(author_recipes, self.get_feed(followers[0]))
+
+
+class SearchIndexTests(APITestCase):
+    """Поисковый индекс рецептов обновляется при записи."""
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_ingredient_rename(self):
+        get_search_backend().rebuild(batch_size=100)
+        ingredient = Ingredient.objects.create(
+            name='Кардамон', measurement_unit='г'
+        )
+        recipe = self.recipes[0]
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=1
+        )
+        get_search_backend().update([recipe.id])
+        self.assertEqual(self.search('Кардамон'), {recipe.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'Бадьян'
+            ingredient.save()
+        self.assertEqual(self.search('Бадьян'), {recipe.id})
+        self.assertEqual(self.search('Кардамон'), set())
+
+
+class BulkTests(APITestCase):
+    """
+    Массовое добавление и удаление обходит сигналы моделей, поэтому
+    счётчики рецептов и список покупок обновляются отдельно.
+    """
+
+    def bulk(self, method, path, ids):
+        response = getattr(self.client, method)(
+            path, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status'] for item in response.data}
+
+    def assert_counters(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count()
+            )
+            self.assertEqual(
+                recipe.in_cart_count,
+                ShoppingCart.objects.filter(recipe=recipe).count()
+            )
+
+    def assert_bulk(self, path, personal_field):
+        added, new, other = self.recipes[0], self.recipes[3:5], self.recipes[5]
+        statuses = self.bulk('post', path, [
+            added.id, new[0].id, new[1].id, new[0].id, 999999
+        ])
+        self.assertEqual(statuses, {
+            added.id: 'already_added', new[0].id: 'added',
+            new[1].id: 'added', 999999: 'not_found',
+        })
+        self.assert_counters()
+        self.assertTrue(all(
+            self.client.get(f'/api/recipes/{recipe.id}/').data[
+                personal_field
+            ] for recipe in new
+        ))
+
+        statuses = self.bulk('delete', path, [
+            added.id, new[0].id, other.id, 999999
+        ])
+        self.assertEqual(statuses, {
+            added.id: 'removed', new[0].id: 'removed',
+            other.id: 'not_added', 999999: 'not_found',
+        })
+        self.assert_counters()
+        self.assertFalse(
+            self.client.get(f'/api/recipes/{added.id}/').data[personal_field]
+        )
+
+    def test_favorite(self):
+        self.assert_bulk('/api/recipes/favorite/bulk/', 'is_favorited')
+
+    def test_shopping_cart(self):
+        self.assert_shopping_list(self.user)
+        self.assert_bulk(
+            '/api/recipes/shopping_cart/bulk/', 'is_in_shopping_cart'
+        )
+        self.assert_shopping_list(self.user)
+
+
+class ShoppingListTests(APITestCase):
+    """Сохранённый список покупок следует за корзиной и рецептами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = cls.recipes[0].author
+        ShoppingCart.objects.create(user=cls.author, recipe=cls.recipes[0])
+
+    def assert_shopping_lists(self):
+        for user in (self.user, self.author):
+            self.assert_shopping_list(user)
+
+    def test_cart_add_and_remove(self):
+        path = f'/api/recipes/{self.recipes[3].id}/shopping_cart/'
+        self.assertEqual(self.client.post(path).status_code, 201)
+        self.assert_shopping_lists()
+        self.assertEqual(self.client.delete(path).status_code, 204)
+        self.assert_shopping_lists()
+        path = f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        self.assertEqual(self.client.delete(path).status_code, 204)
+        self.assert_shopping_lists()
+
+    def test_recipe_ingredients_update(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.recipes[0].id}/',
+            {
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 25},
+                    {'id': self.ingredients[1].id, 'amount': 10},
+                ],
+                'tags': [self.tags[0].id],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_shopping_lists()
+        self.assertEqual(
+            get_live_shopping_list(self.author.id),
+            {self.ingredients[0].id: 25, self.ingredients[1].id: 10}
+        )
+
+    def test_recipe_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_lists()
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.author).exists()
+        )
+
+
+class CatalogCacheTests(APITestCase):
+    """ETag справочников и размер их кэша."""
+
+    def get_etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_if_none_match(self):
+        etag = self.get_etag('/api/ingredients/')
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            response = self.client.get(
+                '/api/ingredients/', HTTP_IF_NONE_MATCH=header
+            )
+            self.assertEqual(response.status_code, 304, header)
+        for header in (etag[:-2] + '"', f'"x{etag[1:]}', '"other"'):
+            response = self.client.get(
+                '/api/ingredients/', HTTP_IF_NONE_MATCH=header
+            )
+            self.assertEqual(response.status_code, 200, header)
+
+    def test_key_uses_normalized_params(self):
+        etag = self.get_etag('/api/ingredients/?name=Соль')
+        self.assertEqual(etag, self.get_etag('/api/ingredients/?name=соль'))
+        self.assertEqual(
+            etag, self.get_etag('/api/ingredients/?name=соль&page=2')
+        )
+        self.assertEqual(
+            self.get_etag('/api/tags/'), self.get_etag('/api/tags/?x=1')
+        )
+
+    def test_search_is_not_stored(self):
+        with mock.patch.object(caches['default'], 'set') as cache_set:
+            for number in range(3):
+                self.get_etag(f'/api/ingredients/?name=ингредиент{number}')
+            cache_set.assert_not_called()
+            self.get_etag('/api/ingredients/')
+            cache_set.assert_called_once()
+
+
+class MetricsArchiveTests(TestCase):
+    """Файлы метрик завершившихся воркеров сводятся в архив."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=self.directory
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Файл процесса должен появиться во временном каталоге.
+        path = mock.patch.object(metrics, '_path', None)
+        path.start()
+        self.addCleanup(path.stop)
+
+    def write_worker(self, pid):
+        path = os.path.join(self.directory, f'metrics_{pid}_1.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump([
+                ['foodgram_http_requests_total', [['method', 'GET']], 3],
+                ['foodgram_db_pool_size', [], 4],
+            ], file)
+
+    def test_archive_keeps_counters(self):
+        # Процессов с такими pid нет: воркеры уже завершились.
+        for pid in (4000000, 4000001):
+            self.write_worker(pid)
+        key = ('foodgram_http_requests_total', (('method', 'GET'),))
+        before = metrics.collect()
+        for pid in (4000000, 4000001):
+            archive_process(self.directory, pid)
+            self.assertEqual(metrics.collect(), before)
+        self.assertEqual(before[key], 6)
+        self.assertNotIn(('foodgram_db_pool_size', ()), before)
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory)
+                   if not name.startswith(f'metrics_{os.getpid()}_')),
+            ['archive.json']
+        )
+        clear_metrics(self.directory)
+        self.assertEqual(os.listdir(self.directory), [])
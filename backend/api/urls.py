@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.views.metrics import MetricsView
 from api.views.recipes import IngredientViewSet, RecipeViewSet, TagViewSet
 from api.views.users import UserSubscriptionsViewSet
 
@@ -10,6 +11,7 @@ router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'users', UserSubscriptionsViewSet, basename='users')
 urlpatterns = [
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
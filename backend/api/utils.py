@@ -1,29 +1,157 @@
-import io
+import csv
+import json
+from collections import defaultdict
 
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
+from fpdf import FPDF
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import RecipeIngredient
+from recipes.models import Recipe, ShoppingListItem
 
 
-def create_shopping_cart_file(user):
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__shopping_cart__user=user
+def get_recipes_limit(request):
+    """
+    Возвращает значение параметра recipes_limit
+    или None, если параметр не передан.
+    """
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit in (None, ''):
+        return None
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = 0
+    if recipes_limit < 1:
+        raise ValidationError(
+            {'recipes_limit': 'Значение должно быть целым числом больше 0.'}
+        )
+    return recipes_limit
+
+
+def get_recipes_by_author(author_ids, recipes_limit=None):
+    """
+    Загружает рецепты авторов одним запросом и группирует их по автору.
+    Для ограничения числа рецептов каждого автора используется
+    оконная функция ROW_NUMBER() OVER (PARTITION BY author_id).
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids).only(
+        'id', 'author_id', 'name', 'image', 'image_variants', 'cooking_time'
+    )
+    if recipes_limit is not None:
+        ranked = recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()]
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked_recipes '
+            f'WHERE row_number <= %s ORDER BY author_id, row_number',
+            (*params, recipes_limit)
+        )
+    recipes_by_author = defaultdict(list)
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+def get_shopping_cart_ingredients(user):
+    """
+    Итератор по ингредиентам списка покупок пользователя.
+    Строки читаются серверным курсором порциями.
+    """
+    return ShoppingListItem.objects.filter(
+        user=user
     ).values(
         'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(ingredient_amount=Sum('amount'))
+    ).annotate(
+        ingredient_amount=F('total_amount')
+    ).order_by('ingredient__name').iterator(
+        chunk_size=settings.SHOPPING_CART_CHUNK_SIZE
+    )
+
+
+class Echo:
+    """Буфер, который сразу возвращает записанную строку."""
+    def write(self, value):
+        return value
 
-    shopping_cart = ['Список покупок:\n']
+
+def iter_shopping_cart_txt(ingredients):
+    yield 'Список покупок:\n'
     for ingredient in ingredients:
         name = ingredient['ingredient__name']
         unit = ingredient['ingredient__measurement_unit']
         amount = ingredient['ingredient_amount']
-        shopping_cart.append(f'\n{name} - {amount}, {unit}')
+        yield f'\n\n{name} - {amount}, {unit}'
+
+
+def iter_shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['ingredient_amount'],
+        ))
 
-    file_content = '\n'.join(shopping_cart)
-    file_name = 'shopping_cart.txt'
-    file = io.BytesIO(file_content.encode())
-    response = FileResponse(file, content_type='text/plain')
-    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
 
+def iter_shopping_cart_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['ingredient_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+def iter_shopping_cart_pdf(ingredients):
+    """
+    PDF собирается построчно, размер документа ограничен
+    числом различных ингредиентов, а не числом рецептов.
+    """
+    pdf = FPDF()
+    pdf.add_font('shopping_cart', fname=settings.SHOPPING_CART_PDF_FONT)
+    pdf.set_font('shopping_cart', size=14)
+    pdf.add_page()
+    pdf.cell(0, 10, 'Список покупок:', new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font_size(12)
+    for ingredient in ingredients:
+        name = ingredient['ingredient__name']
+        unit = ingredient['ingredient__measurement_unit']
+        amount = ingredient['ingredient_amount']
+        pdf.cell(
+            0, 8, f'{name} - {amount}, {unit}', new_x='LMARGIN', new_y='NEXT'
+        )
+    content = pdf.output()
+    for start in range(0, len(content), settings.SHOPPING_CART_PDF_CHUNK):
+        yield bytes(content[start:start + settings.SHOPPING_CART_PDF_CHUNK])
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (iter_shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (iter_shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'json': (iter_shopping_cart_json, 'application/json'),
+    'pdf': (iter_shopping_cart_pdf, 'application/pdf'),
+}
+
+
+def create_shopping_cart_file(user, file_format='txt'):
+    """Потоковая выгрузка списка покупок в выбранном формате."""
+    iter_content, content_type = SHOPPING_CART_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        iter_content(get_shopping_cart_ingredients(user)),
+        content_type=content_type
+    )
+    file_name = f'shopping_cart.{file_format}'
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
     return response
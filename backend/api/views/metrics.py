@@ -0,0 +1,18 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.metrics import metrics
+from api.permissions import IsMetricsScraper
+from api.renderers import MetricsRenderer
+
+
+class MetricsView(APIView):
+    """Метрики всех процессов в формате Prometheus."""
+    permission_classes = (IsMetricsScraper,)
+    renderer_classes = (MetricsRenderer,)
+
+    def get(self, request):
+        return Response(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -1,34 +1,55 @@
+import hashlib
+
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
     AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly,)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from django.db.models import Exists, OuterRef
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag, urlencode
 
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomPageNumberPagination
+from api.indexes import ingredient_index, ingredient_trigram_index
+from api.metrics import metrics
+from api.pagination import (CustomPageNumberPagination,
+                            FeedCursorPagination, RecipeCursorPagination)
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from api.serializers.recipes import (
     FavoriteSerializer,
     FullRecipeInfoSerializer,
     IngredientSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     ShoppingCartSerializer,
     TagSerializer,
 )
 from api.utils import create_shopping_cart_file
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.bulk import bulk_add, bulk_remove, lock_user
+from recipes.feed import get_feed_sources
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.versions import get_version
 
 
 class RecipeCreateDeleteModelMixin:
     """
     Миксин для создания и удаления моделей рецептов.
     """
+    @transaction.atomic
     def create_model(self, request, instance, serializer_name):
         """Метод для добавления модели."""
+        lock_user(request.user.id)
         serializer = serializer_name(
             data={'user': request.user.id, 'recipe': instance.id},
             context={'request': request}
@@ -37,8 +58,10 @@ class RecipeCreateDeleteModelMixin:
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_model(self, request, model_name, instance, error_message):
         """Метод для удаления модели."""
+        lock_user(request.user.id)
         if not model_name.objects.filter(
                 user=request.user, recipe=instance).exists():
             return Response(
@@ -46,25 +69,184 @@ class RecipeCreateDeleteModelMixin:
         model_name.objects.filter(user=request.user, recipe=instance).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @transaction.atomic
+    def bulk_model(self, request, model_name):
+        """
+        Метод для массового добавления (POST) или удаления (DELETE)
+        рецептов. Возвращает результат для каждого id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        if request.method == 'POST':
+            results = bulk_add(model_name, request.user.id, recipe_ids)
+        else:
+            results = bulk_remove(model_name, request.user.id, recipe_ids)
+        return Response([
+            {'id': recipe_id, 'status': results[recipe_id]}
+            for recipe_id in recipe_ids
+        ])
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogCacheMixin:
+    """
+    Миксин HTTP-кэширования справочников.
+    Ответы кэшируются в виде готового JSON для каждой версии
+    справочника, клиенту отдаётся ETag, а на совпадающий
+    If-None-Match возвращается 304 без обращения к БД.
+    """
+    catalog_name = None
+
+    def perform_authentication(self, request):
+        """Справочники доступны всем, пользователь не нужен."""
+
+    def get_catalog_params(self, request):
+        """
+        Нормализованные параметры запроса, от которых зависит ответ.
+        Остальные параметры в ключ кэша не попадают.
+        """
+        return {}
+
+    def is_cacheable(self, params):
+        """Сохранять ли ответ в кэш, а не только отдавать ETag."""
+        return True
+
+    def get_catalog_key(self, request, params):
+        version = get_version(self.catalog_name)
+        query = urlencode(sorted(params.items()))
+        return f'catalog:{self.catalog_name}:{version}:{request.path}?{query}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        params = self.get_catalog_params(request)
+        key = self.get_catalog_key(request, params)
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        # If-None-Match сравнивается слабо: префикс W/ не учитывается.
+        etags = {
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(request.headers.get('If-None-Match', ''))
+        }
+        if etag in etags or '*' in etags:
+            metrics.cache_result('catalog_etag', 1, 0)
+            response = HttpResponseNotModified()
+        else:
+            cacheable = self.is_cacheable(params)
+            content = cache.get(key) if cacheable else None
+            if cacheable:
+                metrics.cache_result(
+                    'catalog', content is not None, content is None
+                )
+            if content is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = JSONRenderer().render(response.data)
+                if cacheable:
+                    cache.set(key, content)
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, must_revalidate=True,
+            max_age=settings.CATALOG_CACHE_MAX_AGE
+        )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для обработки запросов на получение ингредиентов.
     """
+    catalog_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     permission_classes = (AllowAny,)
     pagination_class = None
+    query_budgets = {'list': 2, 'retrieve': 1}
+
+    def get_search_limit(self):
+        """Количество ингредиентов в ответе, не больше максимума."""
+        max_limit = settings.INGREDIENT_SEARCH_MAX_LIMIT
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return max_limit
+        return min(max(limit, 1), max_limit)
+
+    def fuzzy_search(self, name, limit):
+        """
+        Нечёткий поиск ингредиентов по сходству триграмм: через pg_trgm
+        в Postgres и по индексу в памяти процесса на остальных базах.
+        """
+        threshold = settings.INGREDIENT_TRIGRAM_THRESHOLD
+        if connection.vendor != 'postgresql':
+            return ingredient_trigram_index.search(name, limit, threshold)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET LOCAL pg_trgm.similarity_threshold = %s',
+                    [threshold]
+                )
+            return list(Ingredient.objects.filter(
+                name__trigram_similar=name
+            ).annotate(
+                similarity=TrigramSimilarity('name', name)
+            ).order_by('-similarity', 'name').values(
+                'id', 'name', 'measurement_unit'
+            )[:limit])
 
+    def get_catalog_params(self, request):
+        if self.action != 'list':
+            return {}
+        return {
+            'name': request.query_params.get('name', '').lower(),
+            'limit': self.get_search_limit(),
+            'fuzzy': self.is_fuzzy(request),
+            'index': settings.INGREDIENT_SEARCH_INDEX,
+        }
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    def is_cacheable(self, params):
+        # Поиск по названию кэшируется только через ETag: иначе каждый
+        # новый текст запроса добавлял бы запись в общий кэш.
+        return not params.get('name')
+
+    def is_fuzzy(self, request):
+        return request.query_params.get('fuzzy', '').lower() in ('1', 'true')
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        if name and self.is_fuzzy(request):
+            return Response(self.fuzzy_search(name, self.get_search_limit()))
+        if not settings.INGREDIENT_SEARCH_INDEX:
+            return super(CatalogCacheMixin, self).list(
+                request, *args, **kwargs
+            )
+        return Response(ingredient_index.search(name, self.get_search_limit()))
+
+    def list(self, request, *args, **kwargs):
+        # Поиск по индексу и нечёткий поиск тоже идут через кэш
+        # справочника: ключ включает нормализованные параметры поиска.
+        return self.cached_response(self.search, request, *args, **kwargs)
+
+
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для обработки запросов на получение тегов."""
+    catalog_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny, )
     pagination_class = None
+    query_budgets = {'list': 1, 'retrieve': 1}
 
 
 class RecipeViewSet(RecipeCreateDeleteModelMixin, viewsets.ModelViewSet):
@@ -84,11 +266,59 @@ class RecipeViewSet(RecipeCreateDeleteModelMixin, viewsets.ModelViewSet):
         'patch',
         'delete'
     ]
+    # Число SQL-запросов с холодными кэшами. Создание, изменение
+    # и удаление рецепта зависят от размера рецепта и корзин,
+    # поэтому бюджета не имеют.
+    query_budgets = {
+        'list': 8,
+        'retrieve': 7,
+        'feed': 8,
+        'favorite': 8,
+        'delete_favorite': 8,
+        'shopping_cart': 11,
+        'delete_shopping_cart': 10,
+        'favorite_bulk': 9,
+        'shopping_cart_bulk': 9,
+        'download_shopping_cart': 2,
+    }
+
+    @property
+    def paginator(self):
+        """
+        Keyset-пагинация включается параметром cursor,
+        по умолчанию используется постраничная.
+        """
+        if not hasattr(self, '_paginator'):
+            cursor_param = RecipeCursorPagination.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
-        queryset = Recipe.objects.select_related('author').prefetch_related(
-            'ingredients', 'tags'
-        )
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve', 'feed'):
+            # Поисковый вектор не выводится, а весит больше текста рецепта.
+            queryset = queryset.defer('search_vector')
+            if settings.RECIPE_REPRESENTATION_CACHE:
+                # Связанные данные загружает сериализатор
+                # только для рецептов, которых нет в кэше.
+                return self.annotate_personal_fields(queryset)
+            queryset = queryset.select_related('author').prefetch_related(
+                Prefetch(
+                    'recipe_ingredient',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+                'tags'
+            )
+        else:
+            queryset = queryset.select_related('author')
+        return self.annotate_personal_fields(queryset)
+
+    def annotate_personal_fields(self, queryset):
         if self.request.user.is_authenticated:
             queryset = queryset.annotate(
                 is_favorited=Exists(
@@ -107,11 +337,42 @@ class RecipeViewSet(RecipeCreateDeleteModelMixin, viewsets.ModelViewSet):
 
         return queryset
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Рецепт сериализуется списочным сериализатором,
+        чтобы использовать кэш представлений.
+        """
+        serializer = self.get_serializer([self.get_object()], many=True)
+        return Response(serializer.data[0])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return FullRecipeInfoSerializer
         return RecipeSerializer
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, ]
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым с keyset-пагинацией.
+        """
+        paginator = FeedCursorPagination()
+        rows = paginator.paginate_sources(
+            get_feed_sources(request.user), request
+        )
+        recipes = self.get_queryset().in_bulk([pk for _, pk in rows])
+        page = [recipes[pk] for _, pk in rows if pk in recipes]
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=['post'],
@@ -174,12 +435,41 @@ class RecipeViewSet(RecipeCreateDeleteModelMixin, viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=['get'],
+        methods=['post', 'delete'],
+        url_path='favorite/bulk',
         permission_classes=[IsAuthenticated, ]
     )
+    def favorite_bulk(self, request):
+        """
+        Массовое добавление/удаление рецептов в избранном.
+        """
+        return self.bulk_model(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def shopping_cart_bulk(self, request):
+        """
+        Массовое добавление/удаление рецептов в списке покупок.
+        """
+        return self.bulk_model(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, ],
+        renderer_classes=[
+            PlainTextRenderer, CSVRenderer, JSONRenderer, PDFRenderer
+        ]
+    )
     def download_shopping_cart(self, request):
         """
         Скачивание файла со списком покупок.
+        Формат выбирается параметром format: txt, csv, json или pdf.
         """
-        response = create_shopping_cart_file(request.user)
+        file_format = request.query_params.get('format', 'txt')
+        response = create_shopping_cart_file(request.user, file_format)
         return response
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import BooleanField, Value
 from django.shortcuts import get_object_or_404
 
 from rest_framework import status, viewsets
@@ -6,7 +8,7 @@ from rest_framework.response import Response
 
 from api.serializers.recipes import (UserSubscribeRepresentSerializer,
                                      UserSubscribeSerializer)
-
+from api.utils import get_recipes_by_author, get_recipes_limit
 from users.models import Follow, User
 
 
@@ -14,8 +16,10 @@ class UserSubscriptionsViewSet(viewsets.GenericViewSet):
     """
     Вьюсет управления подписками
     """
+    query_budgets = {'subscriptions': 5, 'subscribe': 13, 'unsubscribe': 8}
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def subscribe(self, request, pk=None):
         author = get_object_or_404(User, pk=pk)
         serializer = UserSubscribeSerializer(
@@ -27,6 +31,7 @@ class UserSubscriptionsViewSet(viewsets.GenericViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
+    @transaction.atomic
     def unsubscribe(self, request, pk=None):
         author = get_object_or_404(User, pk=pk)
         if not Follow.objects.filter(
@@ -45,10 +50,17 @@ class UserSubscriptionsViewSet(viewsets.GenericViewSet):
 
     @action(detail=False)
     def subscriptions(self, request):
-        authors = User.objects.filter(following__user=self.request.user)
+        recipes_limit = get_recipes_limit(request)
+        authors = User.objects.filter(
+            following__user=self.request.user
+        ).annotate(is_subscribed=Value(True, output_field=BooleanField()))
         page = self.paginate_queryset(authors)
+        recipes_by_author = get_recipes_by_author(
+            [author.id for author in page], recipes_limit
+        )
         serializer = UserSubscribeRepresentSerializer(
             page,
             many=True, context={
-                'request': request})
+                'request': request,
+                'recipes_by_author': recipes_by_author})
         return self.get_paginated_response(serializer.data)
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from api.metrics import metrics
+from foodgram.db.pool import get_pool
+
+Database = base.Database
+
+
+def ping(connection):
+    """Соединение живо и отвечает на запросы."""
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Database.Error:
+        return False
+    return True
+
+
+def reset(connection):
+    """
+    Откатывает незавершённую транзакцию перед возвратом в пул.
+    False — соединение непригодно и должно быть закрыто.
+    """
+    if connection.closed:
+        return False
+    try:
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except Database.Error:
+        return False
+    return connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой постоянных соединений и необязательным
+    пулом соединений внутри процесса.
+
+    При DB_HEALTH_CHECKS соединение, оставшееся от прошлого
+    HTTP-запроса (CONN_MAX_AGE), проверяется перед первым
+    использованием в новом запросе и при обрыве открывается заново.
+    При DB_POOL_SIZE > 0 соединение берётся из пула и возвращается
+    в него вместо закрытия.
+    """
+    health_check_done = False
+
+    def get_pool(self):
+        if not settings.DB_POOL_SIZE:
+            return None
+        return get_pool(
+            self.alias, settings.DB_POOL_SIZE, settings.DB_POOL_TIMEOUT,
+            settings.DB_POOL_MAX_LIFETIME,
+            check=ping if settings.DB_HEALTH_CHECKS else None
+        )
+
+    def open_connection(self, conn_params):
+        metrics.inc('foodgram_db_connections_opened_total',
+                    database=self.alias)
+        return super().get_new_connection(conn_params)
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            return self.open_connection(conn_params)
+        connection = pool.get(lambda: self.open_connection(conn_params))
+        # Уровень изоляции задан при открытии соединения, здесь
+        # он только запоминается, как в родительском методе.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def connect(self):
+        # Только что открытое соединение проверять не нужно.
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+            and settings.DB_HEALTH_CHECKS
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Соединение, закрытое внутри atomic(), остаётся у обёртки до
+        # конца блока, поэтому в пул его возвращать нельзя.
+        pool.put(
+            self.connection,
+            reusable=not self.in_atomic_block and reset(self.connection)
+        )
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+
+from api.metrics import metrics
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений с БД внутри процесса. Потоки берут соединение
+    на время HTTP-запроса и возвращают его при закрытии; если все
+    size соединений заняты, поток ждёт не дольше timeout секунд.
+    Соединения старше max_lifetime секунд закрываются при возврате.
+    """
+    def __init__(self, alias, size, timeout, max_lifetime, check=None):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check = check
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        self._idle = []
+        self._created = {}
+        self._in_use = 0
+        self.stats = {
+            'opened': 0, 'closed': 0, 'checkouts': 0,
+            'waits': 0, 'timeouts': 0,
+        }
+
+    def get(self, connect):
+        """
+        Свободное соединение из пула или новое, открытое функцией
+        connect, если размер пула ещё не достигнут. Проверка check
+        выполняется вне блокировки пула.
+        """
+        start = time.monotonic()
+        while True:
+            connection = self._checkout(start + self.timeout)
+            if connection is None:
+                connection = self._open(connect)
+                break
+            if self.check is None or self.check(connection):
+                break
+            self._release(connection, reusable=False)
+        metrics.observe('foodgram_db_pool_wait_seconds',
+                        time.monotonic() - start, database=self.alias)
+        self.update_gauges()
+        return connection
+
+    def put(self, connection, reusable=True):
+        """Возвращает соединение в пул или закрывает его."""
+        self._release(connection, reusable)
+        self.update_gauges()
+
+    def _checkout(self, deadline):
+        """
+        Занимает место в пуле. Возвращает последнее вернувшееся
+        соединение — редко используемые доживают до max_lifetime
+        и закрываются — или None, если нужно открыть новое.
+        """
+        with self._condition:
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    metrics.inc('foodgram_db_pool_timeouts_total',
+                                database=self.alias)
+                    raise PoolTimeout(
+                        f'Нет свободных соединений с БД {self.alias} '
+                        f'за {self.timeout} с, размер пула {self.size}'
+                    )
+                self.stats['waits'] += 1
+                self._condition.wait(remaining)
+            self._in_use += 1
+            self.stats['checkouts'] += 1
+            return self._idle.pop() if self._idle else None
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._created[id(connection)] = time.monotonic()
+            self.stats['opened'] += 1
+        return connection
+
+    def _release(self, connection, reusable):
+        with self._condition:
+            self._in_use -= 1
+            created = self._created.get(id(connection), 0)
+            if reusable and time.monotonic() - created < self.max_lifetime:
+                self._idle.append(connection)
+            else:
+                self._discard(connection)
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self._created.pop(id(connection), None)
+        self.stats['closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def update_gauges(self):
+        metrics.set('foodgram_db_pool_connections', self._in_use,
+                    database=self.alias, state='in_use')
+        metrics.set('foodgram_db_pool_connections', len(self._idle),
+                    database=self.alias, state='idle')
+        metrics.set('foodgram_db_pool_size', self.size, database=self.alias)
+
+    def get_stats(self):
+        with self._condition:
+            return dict(
+                self.stats, size=self.size, in_use=self._in_use,
+                idle=len(self._idle)
+            )
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop())
+        self.update_gauges()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, size, timeout, max_lifetime, check=None):
+    """
+    Пул процесса для базы alias. После fork (gunicorn --preload)
+    унаследованные соединения не используются, создаётся новый пул.
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = ConnectionPool(
+                alias, size, timeout, max_lifetime, check
+            )
+        return pool
+
+
+def get_pools():
+    with _pools_lock:
+        return {
+            alias: pool for alias, pool in _pools.items()
+            if pool.pid == os.getpid()
+        }
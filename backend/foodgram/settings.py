@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'colorfield',
 
@@ -36,6 +37,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
+    'api.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,14 +73,28 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Соединение с БД переживает HTTP-запрос и живёт DB_CONN_MAX_AGE секунд,
+# при DB_HEALTH_CHECKS оно проверяется перед первым использованием
+# в каждом запросе. DB_POOL_SIZE > 0 включает пул соединений в процессе:
+# соединение возвращается в пул в конце каждого запроса. Всего к БД
+# открыто не больше воркеров gunicorn × DB_POOL_SIZE соединений,
+# сравнить с max_connections: python manage.py db_connections
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'True').lower() == 'true'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL_SIZE else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
     }
 }
 
@@ -137,12 +155,23 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
+# Кэш токенов аутентификации
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
+AUTH_TOKEN_SHARED_CACHE = (
+    os.getenv('AUTH_TOKEN_SHARED_CACHE', 'False').lower() == 'true'
+)
+
+CURSOR_PAGINATION_MAX_LIMIT = int(
+    os.getenv('CURSOR_PAGINATION_MAX_LIMIT', 100)
+)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -161,3 +190,154 @@ DJOSER = {
 AUTH_USER_MODEL = 'users.User'
 
 EMPTY_VALUE = '--пусто--'
+
+# Поиск ингредиентов по индексу в памяти процесса
+INGREDIENT_SEARCH_INDEX = (
+    os.getenv('INGREDIENT_SEARCH_INDEX', 'True').lower() == 'true'
+)
+INGREDIENT_SEARCH_MAX_LIMIT = int(os.getenv('INGREDIENT_SEARCH_MAX_LIMIT', 50))
+# Минимальное сходство триграмм для нечёткого поиска ингредиентов,
+# по умолчанию совпадает с pg_trgm.similarity_threshold
+INGREDIENT_TRIGRAM_THRESHOLD = float(
+    os.getenv('INGREDIENT_TRIGRAM_THRESHOLD', 0.3)
+)
+
+# Лента подписок: рецепты авторов, у которых подписчиков больше
+# порога, не раскладываются по лентам, а читаются при запросе
+FEED_POPULAR_AUTHOR_FOLLOWERS = int(
+    os.getenv('FEED_POPULAR_AUTHOR_FOLLOWERS', 1000)
+)
+# Автор перестаёт быть популярным, когда подписчиков становится
+# меньше этого порога: зазор не даёт раскладывать его рецепты заново
+# при каждой подписке и отписке около FEED_POPULAR_AUTHOR_FOLLOWERS
+FEED_REGULAR_AUTHOR_FOLLOWERS = int(os.getenv(
+    'FEED_REGULAR_AUTHOR_FOLLOWERS', FEED_POPULAR_AUTHOR_FOLLOWERS * 9 // 10
+))
+FEED_FANOUT_BATCH_SIZE = 1000
+
+# Максимум рецептов в одном запросе массового добавления/удаления
+BULK_RECIPES_MAX_IDS = int(os.getenv('BULK_RECIPES_MAX_IDS', 100))
+
+# Инструментация SQL-запросов: заголовок Server-Timing и строка лога
+# на каждый запрос. Бюджеты запросов объявляются атрибутом query_budgets
+# у представлений, здесь — для представлений сторонних пакетов.
+QUERY_INSTRUMENTATION = (
+    os.getenv('QUERY_INSTRUMENTATION', 'False').lower() == 'true'
+)
+QUERY_BUDGETS = {
+    'UserViewSet.list': 4,
+    'UserViewSet.retrieve': 3,
+    'UserViewSet.me': 2,
+}
+
+# Строки лога QueryInstrumentationMiddleware — JSON в stdout
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'stdout': {
+            'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['stdout'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Метрики для Prometheus на /api/metrics. Чтобы значения всех процессов
+# gunicorn суммировались, задайте общий для них каталог METRICS_DIR.
+# Мастер gunicorn (gunicorn.conf.py) очищает каталог при запуске и сводит
+# счётчики завершившихся воркеров в общий архив.
+# Доступ — администраторам или по заголовку Authorization: Bearer METRICS_TOKEN.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Журнал медленных SQL-запросов в формате JSON Lines, сводка —
+# python manage.py slow_queries. Для доли SLOW_QUERY_EXPLAIN_RATE
+# медленных SELECT сохраняется план выполнения.
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG')
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+
+# Кэш должен быть общим для всех процессов gunicorn: в нём хранятся
+# готовые ответы. Версии наборов данных хранятся в отдельном кэше без
+# срока жизни, общем и для веб-контейнеров, и для image_worker,
+# в docker-compose это memcached. Файловый кэш подходит только для
+# запуска в одном контейнере.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+)
+VERSIONS_CACHE_BACKEND = os.getenv('VERSIONS_CACHE_BACKEND', CACHE_BACKEND)
+# По умолчанию файловый кэш хранит всего 300 ключей, а представлений
+# рецептов — по ключу на рецепт.
+FILE_CACHE_OPTIONS = {
+    'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+        'OPTIONS': (
+            FILE_CACHE_OPTIONS if CACHE_BACKEND.endswith('FileBasedCache')
+            else {}
+        ),
+    },
+    'versions': {
+        'BACKEND': VERSIONS_CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'VERSIONS_CACHE_LOCATION', '/tmp/foodgram_versions'
+        ),
+        'TIMEOUT': None,
+        'OPTIONS': (
+            FILE_CACHE_OPTIONS
+            if VERSIONS_CACHE_BACKEND.endswith('FileBasedCache') else {}
+        ),
+    },
+}
+
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 0))
+
+# Кэш общих для всех пользователей представлений рецептов
+RECIPE_REPRESENTATION_CACHE = (
+    os.getenv('RECIPE_REPRESENTATION_CACHE', 'True').lower() == 'true'
+)
+RECIPE_REPRESENTATION_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Полнотекстовый поиск рецептов. Если бэкенд не задан,
+# он выбирается по типу базы данных.
+RECIPE_SEARCH_BACKEND = os.getenv('RECIPE_SEARCH_BACKEND')
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+# Рецептов в одной пачке при обновлении индекса после
+# переименования ингредиента
+RECIPE_SEARCH_BATCH_SIZE = 1000
+
+# Картинки рецептов
+RECIPE_IMAGE_FORMATS = ('jpeg', 'jpg', 'png', 'gif', 'webp')
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_DECODE_CHUNK = 64 * 1024
+RECIPE_IMAGE_VARIANTS = {
+    'small': 320,
+    'medium': 800,
+}
+RECIPE_IMAGE_QUALITY = 80
+
+# Выгрузка списка покупок
+SHOPPING_CART_CHUNK_SIZE = 500
+SHOPPING_CART_PDF_CHUNK = 64 * 1024
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
@@ -0,0 +1,18 @@
+import os
+
+from api.metrics import archive_process, clear_metrics
+
+# Каталог файлов метрик процессов, см. METRICS_DIR в настройках.
+METRICS_DIR = os.getenv('METRICS_DIR')
+
+
+def on_starting(server):
+    """Файлы метрик прошлого запуска больше не нужны."""
+    if METRICS_DIR:
+        clear_metrics(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    """Счётчики завершившегося воркера переносятся в архив."""
+    if METRICS_DIR:
+        archive_process(METRICS_DIR, worker.pid)
@@ -1,8 +1,10 @@
 from django.conf import settings
-from django.contrib.admin import ModelAdmin, TabularInline, register
+from django.contrib.admin import (ModelAdmin, TabularInline, display,
+                                  register)
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import update_search_index
 
 
 class IngredientInline(TabularInline):
@@ -54,8 +56,13 @@ class RecipeAdmin(ModelAdmin):
                TagInline
                ]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_index([form.instance.id])
+
+    @display(description='В избранном', ordering='favorites_count')
     def favorites_amount(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @register(RecipeIngredient)
@@ -76,3 +83,10 @@ class ShoppingCartAdmin(ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     search_fields = ('user', 'recipe')
     empty_value_display = settings.EMPTY_VALUE
+
+
+@register(ShoppingListItem)
+class ShoppingListItemAdmin(ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    empty_value_display = settings.EMPTY_VALUE
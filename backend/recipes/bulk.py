@@ -0,0 +1,111 @@
+from django.db import connection
+
+from recipes.models import Recipe, ShoppingCart
+from recipes.shopping_list import change_shopping_lists, get_recipes_amounts
+from users.counters import update_counters
+from users.models import User
+
+RECIPE_COUNTERS = {
+    'favorite': 'favorites_count',
+    'shoppingcart': 'in_cart_count',
+}
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+
+
+def lock_user(user_id):
+    """
+    Блокирует строку пользователя до конца транзакции. Запросы одного
+    пользователя к избранному и корзине выполняются по очереди, иначе
+    параллельные запросы посчитали бы одни и те же рецепты
+    добавленными дважды и дважды изменили бы счётчики и список покупок.
+    """
+    list(User.objects.select_for_update().filter(
+        pk=user_id
+    ).values_list('id', flat=True))
+
+
+def delete_rows(model, user_id, recipe_ids):
+    """
+    Удаляет строки model одним DELETE без загрузки объектов и сигналов:
+    их обработчики заменены массовыми обновлениями в bulk_remove.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} '
+            f'WHERE user_id = %s AND recipe_id IN ({placeholders})',
+            [user_id, *recipe_ids]
+        )
+
+
+def get_statuses(model, user_id, recipe_ids):
+    """
+    Делит recipe_ids на несуществующие рецепты, уже добавленные
+    пользователем в model и ещё не добавленные.
+    """
+    existing = set(Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('id', flat=True))
+    added = set(model.objects.filter(
+        user_id=user_id, recipe_id__in=existing
+    ).values_list('recipe_id', flat=True))
+    return set(recipe_ids) - existing, added, existing - added
+
+
+def bulk_add(model, user_id, recipe_ids):
+    """
+    Добавляет рецепты в избранное или корзину одним INSERT.
+    Сигналы при массовой вставке не отправляются, поэтому счётчики
+    рецептов и список покупок обновляются здесь же.
+    Возвращает словарь {id рецепта: результат}.
+    Вызывается внутри транзакции.
+    """
+    lock_user(user_id)
+    not_found, already_added, to_add = get_statuses(
+        model, user_id, recipe_ids
+    )
+    model.objects.bulk_create(
+        [model(user_id=user_id, recipe_id=recipe_id) for recipe_id in to_add],
+        ignore_conflicts=True
+    )
+    update_counters(
+        Recipe, to_add, RECIPE_COUNTERS[model._meta.model_name], 1
+    )
+    if model is ShoppingCart and to_add:
+        change_shopping_lists([user_id], get_recipes_amounts(to_add))
+    results = dict.fromkeys(not_found, NOT_FOUND)
+    results.update(dict.fromkeys(already_added, ALREADY_ADDED))
+    results.update(dict.fromkeys(to_add, ADDED))
+    return results
+
+
+def bulk_remove(model, user_id, recipe_ids):
+    """
+    Удаляет рецепты из избранного или корзины одним DELETE
+    и, как и bulk_add, сам обновляет счётчики и список покупок.
+    """
+    lock_user(user_id)
+    not_found, to_remove, not_added = get_statuses(
+        model, user_id, recipe_ids
+    )
+    if model is ShoppingCart and to_remove:
+        change_shopping_lists([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in get_recipes_amounts(to_remove).items()
+        })
+    if to_remove:
+        delete_rows(model, user_id, list(to_remove))
+    update_counters(
+        Recipe, to_remove, RECIPE_COUNTERS[model._meta.model_name], -1
+    )
+    results = dict.fromkeys(not_found, NOT_FOUND)
+    results.update(dict.fromkeys(not_added, NOT_ADDED))
+    results.update(dict.fromkeys(to_remove, REMOVED))
+    return results
@@ -0,0 +1,138 @@
+from django.conf import settings
+
+from recipes.models import FeedEntry, FeedRefillTask, Recipe
+from users.models import Follow, User
+
+
+def is_popular(author_id):
+    """
+    У популярного автора слишком много подписчиков, чтобы
+    раскладывать его рецепты по лентам при публикации.
+    """
+    return User.objects.filter(pk=author_id, is_popular=True).exists()
+
+
+def mark_popular(author_id):
+    """
+    Выставляет флаг популярности после подписки, когда подписчиков
+    стало больше FEED_POPULAR_AUTHOR_FOLLOWERS.
+    """
+    User.objects.filter(
+        pk=author_id, is_popular=False,
+        followers_count__gt=settings.FEED_POPULAR_AUTHOR_FOLLOWERS
+    ).update(is_popular=True)
+
+
+def request_feed_refill(author_id):
+    """
+    После отписки ставит задачу снять флаг популярности, когда
+    подписчиков стало меньше FEED_REGULAR_AUTHOR_FOLLOWERS. Пока задача
+    не выполнена, рецепты автора по-прежнему читаются при запросе ленты.
+    """
+    if User.objects.filter(
+        pk=author_id, is_popular=True,
+        followers_count__lt=settings.FEED_REGULAR_AUTHOR_FOLLOWERS
+    ).exists():
+        FeedRefillTask.objects.bulk_create(
+            [FeedRefillTask(author_id=author_id)], ignore_conflicts=True
+        )
+
+
+def refill_author_feeds(task):
+    """
+    Раскладывает все рецепты автора по лентам подписчиков и снимает
+    флаг популярности. Строка автора заблокирована до конца транзакции,
+    поэтому подписки и новые рецепты, меняющие его счётчики, ждут
+    снятия флага и затем раскладываются сами.
+    """
+    followers_count = User.objects.select_for_update().filter(
+        pk=task.author_id, is_popular=True
+    ).values_list('followers_count', flat=True).first()
+    if (
+        followers_count is None
+        or followers_count >= settings.FEED_REGULAR_AUTHOR_FOLLOWERS
+    ):
+        return
+    fan_out_author(task.author_id)
+    User.objects.filter(pk=task.author_id).update(is_popular=False)
+
+
+def create_entries(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    if is_popular(recipe.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    create_entries(
+        FeedEntry(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+        for user_id in follower_ids.iterator(
+            chunk_size=settings.FEED_FANOUT_BATCH_SIZE
+        )
+    )
+
+
+def fan_out_author(author_id):
+    """Раскладывает все рецепты автора по лентам всех подписчиков."""
+    follower_ids = list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )
+    create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes.iterator(
+            chunk_size=settings.FEED_FANOUT_BATCH_SIZE
+        )
+        for user_id in follower_ids
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту рецепты автора, на которого подписался user_id."""
+    if is_popular(author_id):
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )
+    create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes.iterator(
+            chunk_size=settings.FEED_FANOUT_BATCH_SIZE
+        )
+    )
+
+
+def trim_feed(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def get_feed_sources(user):
+    """
+    Источники ленты для FeedCursorPagination: разложенные записи
+    и рецепты популярных авторов, на которых подписан пользователь.
+    """
+    sources = [(FeedEntry.objects.filter(user=user), 'recipe_id')]
+    popular_ids = list(User.objects.filter(
+        following__user=user, is_popular=True
+    ).values_list('id', flat=True))
+    if popular_ids:
+        sources.append(
+            (Recipe.objects.filter(author_id__in=popular_ids), 'id')
+        )
+    return sources
@@ -0,0 +1,86 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import Recipe, RecipeImageTask
+from recipes.versions import bump_version
+
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+
+
+def enqueue_image_processing(recipe):
+    """
+    Сбрасывает старые копии картинки рецепта и ставит
+    задачу на подготовку новых.
+    """
+    old_variants = recipe.image_variants
+    if old_variants:
+        transaction.on_commit(lambda: delete_image_variants(old_variants))
+    Recipe.objects.filter(pk=recipe.pk).update(image_variants={})
+    recipe.image_variants = {}
+    if recipe.image:
+        RecipeImageTask.objects.create(recipe=recipe, image=recipe.image.name)
+
+
+def create_image_variants(recipe):
+    """
+    Сохраняет уменьшенные копии картинки рецепта во всех форматах
+    и возвращает словарь {размер: {формат: путь к файлу}}.
+    """
+    variants = {}
+    base_name = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    with recipe.image.open('rb') as image_file:
+        image = Image.open(image_file).convert('RGB')
+        for size_name, width in settings.RECIPE_IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((width, width))
+            variants[size_name] = {}
+            for format_name, (pil_format, ext) in VARIANT_FORMATS.items():
+                content = io.BytesIO()
+                resized.save(
+                    content, pil_format,
+                    quality=settings.RECIPE_IMAGE_QUALITY
+                )
+                path = default_storage.save(
+                    f'recipes/variants/{recipe.pk}/'
+                    f'{base_name}_{size_name}.{ext}',
+                    ContentFile(content.getvalue())
+                )
+                variants[size_name][format_name] = path
+    return variants
+
+
+def delete_image_variants(variants):
+    for formats in variants.values():
+        for path in formats.values():
+            default_storage.delete(path)
+
+
+def process_image_task(task):
+    """
+    Выполняет задачу подготовки копий картинки.
+    Если картинку рецепта успели заменить, задача пропускается:
+    для новой картинки поставлена своя задача.
+    """
+    recipe = task.recipe
+    if recipe.image.name != task.image:
+        return
+    old_variants = recipe.image_variants
+    variants = create_image_variants(recipe)
+    if not Recipe.objects.filter(pk=recipe.pk, image=task.image).update(
+        image_variants=variants
+    ):
+        delete_image_variants(variants)
+        return
+    transaction.on_commit(lambda: bump_version(f'recipe:{recipe.pk}'))
+    # Старые копии удаляются только после фиксации: при откате
+    # рецепт продолжит ссылаться на них.
+    transaction.on_commit(lambda: delete_image_variants(old_variants))
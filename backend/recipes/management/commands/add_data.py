@@ -1,12 +1,16 @@
 import csv
+import json
 import logging
 import os
+import re
 import sys
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient, Tag
+from recipes.versions import bump_version
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,46 +22,175 @@ formatter = logging.Formatter(
 handler.setFormatter(formatter)
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+JSON_READ_SIZE = 64 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_csv(file):
+    yield from csv.DictReader(file)
+
+
+def iter_json(file):
+    """
+    Читает JSON-массив объектов по частям и отдаёт объекты по одному,
+    не загружая весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON-файл должен содержать массив объектов')
+    position = 1
+    eof = False
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Некорректный JSON-файл')
+            chunk = file.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+READERS = {
+    '.csv': iter_csv,
+    '.json': iter_json,
+}
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 class Command(BaseCommand):
-    help = 'Загрузка данных в БД'
+    help = (
+        'Загрузка справочников в БД из CSV или JSON: новые записи '
+        'добавляются, изменённые обновляются по естественному ключу'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('ingredients_file', type=str)
         parser.add_argument('tags_file', type=str)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать изменения, не записывая их в БД'
+        )
+
+    def upsert_batch(self, model, key_fields, fields, rows, seen, dry_run):
+        """
+        Сохраняет пачку строк одной транзакцией: один SELECT
+        существующих записей, один bulk_create и один bulk_update.
+        Возвращает количество добавленных, обновлённых и неизменных.
+        """
+        def get_key(values):
+            return tuple(str(values[field]) for field in key_fields)
+
+        items = {}
+        unchanged = 0
+        for row in rows:
+            values = {field: row[field] for field in fields}
+            key = get_key(values)
+            if key in seen or key in items:
+                unchanged += 1
+                continue
+            items[key] = values
+        seen.update(items)
 
-    def handle(self, ingredients_file, tags_file, *args, **options):
+        lookup_field = key_fields[0]
+        existing = {
+            get_key(obj.__dict__): obj
+            for obj in model.objects.filter(**{
+                f'{lookup_field}__in': {key[0] for key in items}
+            })
+        }
+        to_create = []
+        to_update = []
+        for key, values in items.items():
+            obj = existing.get(key)
+            if obj is None:
+                to_create.append(model(**values))
+                continue
+            if all(getattr(obj, field) == value
+                   for field, value in values.items()):
+                unchanged += 1
+                continue
+            for field, value in values.items():
+                setattr(obj, field, value)
+            to_update.append(obj)
+
+        if not dry_run:
+            with transaction.atomic():
+                model.objects.bulk_create(to_create)
+                update_fields = [
+                    field for field in fields if field not in key_fields
+                ]
+                if to_update and update_fields:
+                    model.objects.bulk_update(to_update, update_fields)
+        return len(to_create), len(to_update), unchanged
+
+    def handle(self, ingredients_file, tags_file, *args, batch_size,
+               dry_run, **options):
 
         to_elaborate = [
             {'model': Ingredient,
              'file_name': ingredients_file,
-             'verbose_name': "Ингредиенты"},
+             'verbose_name': "Ингредиенты",
+             'catalog_name': 'ingredients',
+             'key_fields': ('name', 'measurement_unit'),
+             'fields': ('name', 'measurement_unit')},
             {'model': Tag,
              'file_name': tags_file,
-             'verbose_name': "Теги"
-             },
+             'verbose_name': "Теги",
+             'catalog_name': 'tags',
+             'key_fields': ('slug',),
+             'fields': ('name', 'color', 'slug')},
         ]
 
         for element in to_elaborate:
             model = element['model']
             file_name = element['file_name']
             verbose_name = element['verbose_name']
-
-            logger.info(f'Удаление данных в таблице {verbose_name}')
-            model.objects.all().delete()
+            extension = os.path.splitext(file_name)[1].lower()
+            if extension not in READERS:
+                raise CommandError(
+                    f'Неподдерживаемый формат файла: {file_name}'
+                )
 
             logger.info(f'Началась загрузка таблицу {verbose_name}')
-            items = []
+            inserted = updated = unchanged = 0
+            seen = set()
             with open(os.path.join(DATA_ROOT, file_name),
                       encoding='utf-8') as theFile:
-                reader = csv.DictReader(theFile)
-                for line in reader:
-                    items.append(
-                        model(
-                            **line
-                        )
+                for rows in iter_batches(
+                    READERS[extension](theFile), batch_size
+                ):
+                    counts = self.upsert_batch(
+                        model, element['key_fields'], element['fields'],
+                        rows, seen, dry_run
                     )
+                    inserted += counts[0]
+                    updated += counts[1]
+                    unchanged += counts[2]
 
-            model.objects.bulk_create(items)
-            logger.info(f'Закончилась загрузка в таблицу {verbose_name}')
+            if (inserted or updated) and not dry_run:
+                bump_version(element['catalog_name'])
+            logger.info(
+                f'Закончилась загрузка в таблицу {verbose_name}: '
+                f'добавлено {inserted}, обновлено {updated}, '
+                f'без изменений {unchanged}'
+                + (' (пробный запуск)' if dry_run else '')
+            )
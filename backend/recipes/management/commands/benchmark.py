@@ -0,0 +1,220 @@
+import json
+import logging
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stderr)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[rank - 1]
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер времени ответа, количества запросов к БД и пикового '
+        'потребления памяти для эндпоинтов API. Результат выводится в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--user',
+            help='Пользователь, от имени которого выполняются запросы. '
+                 'По умолчанию — пользователь с наибольшим числом подписок'
+        )
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints',
+            help='Запустить только эндпоинты с этими именами'
+        )
+        parser.add_argument('--output', help='Файл для результата')
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        user = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'id').first()
+        if user is None:
+            raise CommandError('В БД нет пользователей, запустите '
+                               'generate_data')
+        return user
+
+    def get_endpoints(self, user):
+        """
+        Эндпоинты из api/urls.py с параметрами, которые использует
+        фронтенд. Запросы на запись возвращают данные в исходное
+        состояние, чтобы замеры можно было повторять.
+        """
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        other = Recipe.objects.exclude(
+            favorites__user=user
+        ).order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        tags = list(Tag.objects.order_by('id')[:2])
+        author = User.objects.order_by('-followers_count', 'id').first()
+        if recipe is None or ingredient is None or not tags:
+            raise CommandError('В БД нет рецептов, запустите generate_data')
+        tag_query = '&'.join(f'tags={tag.slug}' for tag in tags)
+        search = recipe.name.split()[0]
+        prefix = ingredient.name[:3]
+        endpoints = [
+            ('recipes_list', 'get', '/api/recipes/'),
+            ('recipes_list_cursor', 'get', '/api/recipes/?cursor='),
+            ('recipes_list_tags', 'get', f'/api/recipes/?{tag_query}'),
+            ('recipes_list_tags_all', 'get',
+             f'/api/recipes/?{tag_query}&tags_match=all'),
+            ('recipes_list_favorited', 'get',
+             '/api/recipes/?is_favorited=1'),
+            ('recipes_search', 'get', f'/api/recipes/?search={search}'),
+            ('recipes_detail', 'get', f'/api/recipes/{recipe.id}/'),
+            ('recipes_feed', 'get', '/api/recipes/feed/'),
+            ('shopping_cart_txt', 'get',
+             '/api/recipes/download_shopping_cart/'),
+            ('ingredients_prefix', 'get', f'/api/ingredients/?name={prefix}'),
+            ('ingredients_fuzzy', 'get',
+             f'/api/ingredients/?name={prefix}&fuzzy=1'),
+            ('tags_list', 'get', '/api/tags/'),
+            ('tags_detail', 'get', f'/api/tags/{tags[0].id}/'),
+            ('users_list', 'get', '/api/users/'),
+            ('users_me', 'get', '/api/users/me/'),
+            ('users_detail', 'get', f'/api/users/{author.id}/'),
+            ('users_subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3'),
+        ]
+        if other is not None:
+            endpoints.append((
+                'favorite_add_remove', 'post+delete',
+                f'/api/recipes/{other.id}/favorite/'
+            ))
+        return endpoints
+
+    def request(self, client, method, url):
+        responses = []
+        for part in method.split('+'):
+            response = getattr(client, part)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            responses.append(response)
+        return responses
+
+    def run_endpoint(self, client, method, url, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, method, url)
+        timings = []
+        queries = []
+        statuses = set()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                responses = self.request(client, method, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context))
+            statuses.update(response.status_code for response in responses)
+        tracemalloc.start()
+        self.request(client, method, url)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        timings.sort()
+        result = {
+            'method': method.upper(),
+            'url': url,
+            'status': sorted(statuses),
+            'iterations': iterations,
+            'latency_ms': {
+                'min': round(timings[0], 3),
+                'mean': round(sum(timings) / len(timings), 3),
+                'max': round(timings[-1], 3),
+            },
+            'queries': {'min': min(queries), 'max': max(queries)},
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+        for percent in PERCENTILES:
+            result['latency_ms'][f'p{percent}'] = round(
+                percentile(timings, percent), 3
+            )
+        return result
+
+    def handle(self, *args, iterations, warmup, user, endpoints, output,
+               **options):
+        if iterations < 1:
+            raise CommandError('--iterations должно быть больше нуля')
+        user = self.get_user(user)
+        token, _ = Token.objects.get_or_create(user=user)
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'testserver'
+        )
+        client = Client(
+            HTTP_AUTHORIZATION=f'Token {token.key}', HTTP_HOST=host
+        )
+
+        results = {}
+        for name, method, url in self.get_endpoints(user):
+            if endpoints and name not in endpoints:
+                continue
+            logger.info(f'Замер {name}: {method.upper()} {url}')
+            results[name] = self.run_endpoint(
+                client, method, url, iterations, warmup
+            )
+
+        report = {
+            'commit': get_git_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'user': user.username,
+            'data': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'tags': Tag.objects.count(),
+            },
+            'endpoints': results,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                file.write(content)
+            logger.info(f'Результат записан в {output}')
+        else:
+            self.stdout.write(content)
@@ -0,0 +1,52 @@
+import logging
+import sys
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.shopping_list import get_live_shopping_list, rebuild_shopping_list
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stdout)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Сверка списков покупок с содержимым корзин'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать расходящиеся списки покупок'
+        )
+
+    def handle(self, *args, fix, **options):
+        user_ids = set(
+            ShoppingCart.objects.values_list('user_id', flat=True)
+        ) | set(
+            ShoppingListItem.objects.values_list('user_id', flat=True)
+        )
+        mismatched = 0
+        for user_id in sorted(user_ids):
+            stored = dict(ShoppingListItem.objects.filter(
+                user_id=user_id
+            ).values_list('ingredient_id', 'total_amount'))
+            if stored == get_live_shopping_list(user_id):
+                continue
+            mismatched += 1
+            logger.warning(
+                f'Список покупок пользователя {user_id} не совпадает '
+                f'с корзиной'
+            )
+            if fix:
+                with transaction.atomic():
+                    rebuild_shopping_list(user_id)
+        logger.info(
+            f'Проверено списков: {len(user_ids)}, расхождений: {mismatched}'
+        )
@@ -0,0 +1,82 @@
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        'Настройки соединений с БД и сравнение наибольшего числа '
+        'соединений воркеров gunicorn с max_connections PostgreSQL'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=int(os.getenv('WEB_CONCURRENCY', 1)),
+            help='Число воркеров gunicorn, по умолчанию WEB_CONCURRENCY'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Потоков в воркере gunicorn (--threads)'
+        )
+
+    def handle(self, *args, workers, threads, **options):
+        pool_size = settings.DB_POOL_SIZE
+        self.stdout.write(
+            f'CONN_MAX_AGE: {connection.settings_dict["CONN_MAX_AGE"]}, '
+            f'проверка соединений: {settings.DB_HEALTH_CHECKS}'
+        )
+        if pool_size:
+            self.stdout.write(
+                f'Пул: {pool_size} соединений на процесс, ожидание '
+                f'{settings.DB_POOL_TIMEOUT} с, время жизни '
+                f'{settings.DB_POOL_MAX_LIFETIME} с'
+            )
+            if pool_size > threads:
+                self.stdout.write(self.style.WARNING(
+                    f'Пул больше числа потоков воркера ({threads}): '
+                    f'лишние соединения не будут использоваться'
+                ))
+            per_worker = min(pool_size, threads)
+        else:
+            self.stdout.write('Пул отключён: одно соединение на поток')
+            per_worker = threads
+        total = workers * per_worker
+        self.stdout.write(
+            f'Наибольшее число соединений: {workers} воркеров × '
+            f'{per_worker} = {total}'
+        )
+        if connection.vendor != 'postgresql':
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW max_connections')
+            max_connections = int(cursor.fetchone()[0])
+            cursor.execute('SHOW superuser_reserved_connections')
+            reserved = int(cursor.fetchone()[0])
+            cursor.execute(
+                'SELECT state, COUNT(*) FROM pg_stat_activity '
+                'WHERE datname = current_database() '
+                'GROUP BY state ORDER BY state'
+            )
+            states = cursor.fetchall()
+        available = max_connections - reserved
+        self.stdout.write(
+            f'max_connections: {max_connections}, из них доступно '
+            f'приложениям: {available}'
+        )
+        self.stdout.write('Сейчас открыто: ' + ', '.join(
+            f'{state or "фоновые"} — {count}' for state, count in states
+        ))
+        if total > available:
+            self.stdout.write(self.style.ERROR(
+                f'Воркерам может понадобиться {total} соединений, '
+                f'а доступно {available}: уменьшите число воркеров '
+                f'или размер пула'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Запас соединений: {available - total}'
+            ))
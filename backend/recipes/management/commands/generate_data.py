@@ -0,0 +1,253 @@
+import logging
+import random
+import sys
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.feed import backfill_feed
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import get_search_backend
+from recipes.shopping_list import rebuild_shopping_list
+from recipes.versions import bump_version
+from users.models import Follow, User
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stdout)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+PASSWORD = 'foodgram-benchmark'
+DISHES = (
+    'суп', 'борщ', 'салат', 'пирог', 'омлет', 'плов', 'рагу', 'запеканка',
+    'каша', 'паста', 'котлеты', 'блины', 'сырники', 'шашлык', 'голубцы',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'летний', 'острый', 'сытный', 'лёгкий',
+    'праздничный', 'бабушкин', 'овощной', 'сливочный', 'пряный',
+)
+WORDS = (
+    'нарезать', 'обжарить', 'добавить', 'смешать', 'варить', 'запекать',
+    'посолить', 'поперчить', 'остудить', 'подавать', 'минут', 'огне',
+    'духовке', 'сковороде', 'кастрюле', 'зеленью', 'соусом', 'сметаной',
+)
+TAG_COLORS = ('#CD5C5C', '#F08080', '#FA8072', '#FFB6C1', '#8FBC8F',
+              '#4682B4', '#DAA520', '#9370DB')
+
+
+def popularity_weights(count):
+    """
+    Веса по закону Ципфа: немногие авторы и рецепты собирают
+    большую часть подписок, избранного и корзин.
+    """
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+def weighted_sample(rng, population, weights, count):
+    """Выборка без повторов с учётом весов."""
+    count = min(count, len(population))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.update(rng.choices(
+            population, weights=weights, k=count - len(chosen)
+        ))
+    return list(chosen)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических пользователей, рецептов, подписок, '
+        'избранного и корзин для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scale', type=float, default=1.0,
+            help='Множитель количества пользователей и тегов'
+        )
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='Минимальный размер справочника')
+        parser.add_argument('--recipes-per-user', type=int, default=5)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить рецепты')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        scale = options['scale']
+        prefix = f'bench{options["seed"]}'
+
+        tags = self.create_tags(
+            max(1, round(options['tags'] * scale)), prefix
+        )
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        user_ids = self.create_users(
+            max(2, round(options['users'] * scale)), prefix
+        )
+        recipe_ids = self.create_recipes(
+            user_ids, tags, ingredient_ids, options
+        )
+        follows = self.create_relations(
+            Follow, 'author_id', user_ids, user_ids,
+            options['follows_per_user']
+        )
+        self.create_relations(
+            Favorite, 'recipe_id', user_ids, recipe_ids,
+            options['favorites_per_user']
+        )
+        self.create_relations(
+            ShoppingCart, 'recipe_id', user_ids, recipe_ids,
+            options['cart_per_user']
+        )
+        self.update_derived_data(follows, user_ids)
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_tags(self, count, prefix):
+        tags = [
+            Tag(name=f'{prefix} тег {number}',
+                color='#{:06X}'.format(self.rng.randrange(0x1000000)),
+                slug=f'{prefix}-tag-{number}')
+            for number in range(count)
+        ]
+        for tag, color in zip(tags, TAG_COLORS):
+            tag.color = color
+        existing_colors = set(Tag.objects.values_list('color', flat=True))
+        for tag in tags:
+            while tag.color in existing_colors:
+                tag.color = '#{:06X}'.format(self.rng.randrange(0x1000000))
+            existing_colors.add(tag.color)
+        self.bulk_create(Tag, tags)
+        bump_version('tags')
+        logger.info(f'Создано тегов: {count}')
+        return list(Tag.objects.filter(slug__startswith=f'{prefix}-tag-'))
+
+    def create_ingredients(self, count):
+        missing = count - Ingredient.objects.count()
+        if missing > 0:
+            self.bulk_create(Ingredient, [
+                Ingredient(name=f'ингредиент {number}',
+                           measurement_unit=self.rng.choice(('г', 'мл', 'шт')))
+                for number in range(missing)
+            ])
+            bump_version('ingredients')
+            logger.info(f'Создано ингредиентов: {missing}')
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count, prefix):
+        password = make_password(PASSWORD)
+        self.bulk_create(User, [
+            User(username=f'{prefix}_{number}',
+                 email=f'{prefix}_{number}@example.com',
+                 first_name=f'Имя{number}',
+                 last_name=f'Фамилия{number}',
+                 password=password)
+            for number in range(count)
+        ])
+        logger.info(f'Создано пользователей: {count}')
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, user_ids, tags, ingredient_ids, options):
+        rng = self.rng
+        now = timezone.now()
+        recipes = []
+        for author_id in user_ids:
+            for _ in range(rng.randint(0, 2 * options['recipes_per_user'])):
+                recipes.append(Recipe(
+                    author_id=author_id,
+                    name=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(10, 40))),
+                    cooking_time=rng.randint(5, 180),
+                ))
+        with transaction.atomic():
+            self.bulk_create(Recipe, recipes)
+            recipes = list(Recipe.objects.filter(
+                author_id__in=user_ids
+            ).order_by('id'))
+            # pub_date заполняется auto_now, поэтому даты публикации
+            # распределяются отдельным bulk_update.
+            for recipe in recipes:
+                recipe.pub_date = now - timedelta(
+                    seconds=rng.randrange(options['days'] * 24 * 60 * 60)
+                )
+            Recipe.objects.bulk_update(
+                recipes, ['pub_date'], batch_size=self.batch_size
+            )
+            recipe_tags = []
+            recipe_ingredients = []
+            for recipe in recipes:
+                for tag in rng.sample(tags, rng.randint(1, min(3, len(tags)))):
+                    recipe_tags.append(Recipe.tags.through(
+                        recipe_id=recipe.id, tag_id=tag.id
+                    ))
+                for ingredient_id in rng.sample(ingredient_ids, min(
+                    len(ingredient_ids),
+                    rng.randint(1, 2 * options['ingredients_per_recipe'])
+                )):
+                    recipe_ingredients.append(RecipeIngredient(
+                        recipe_id=recipe.id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500)
+                    ))
+            self.bulk_create(Recipe.tags.through, recipe_tags)
+            self.bulk_create(RecipeIngredient, recipe_ingredients)
+        logger.info(
+            f'Создано рецептов: {len(recipes)}, '
+            f'ингредиентов в рецептах: {len(recipe_ingredients)}'
+        )
+        return [recipe.id for recipe in recipes]
+
+    def create_relations(self, model, target_field, user_ids, target_ids,
+                         per_user):
+        """Связи пользователей с популярными по Ципфу объектами."""
+        weights = popularity_weights(len(target_ids))
+        objects = []
+        for user_id in user_ids:
+            count = self.rng.randint(0, 2 * per_user)
+            for target_id in weighted_sample(
+                self.rng, target_ids, weights, count
+            ):
+                if target_id != user_id or model is not Follow:
+                    objects.append(
+                        model(user_id=user_id, **{target_field: target_id})
+                    )
+        self.bulk_create(model, objects)
+        logger.info(f'Создано {model._meta.verbose_name_plural}: '
+                    f'{len(objects)}')
+        return objects
+
+    def update_derived_data(self, follows, user_ids):
+        """
+        Массовая вставка не отправляет сигналы, поэтому счётчики,
+        списки покупок, ленты и поисковый индекс пересчитываются.
+        """
+        call_command('recount')
+        for user_id in ShoppingCart.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', flat=True).distinct():
+            rebuild_shopping_list(user_id)
+        for follow in follows:
+            backfill_feed(follow.user_id, follow.author_id)
+        backend = get_search_backend()
+        if backend is not None:
+            backend.rebuild(self.batch_size)
+        logger.info('Производные данные пересчитаны')
@@ -0,0 +1,264 @@
+import json
+import logging
+import statistics
+import sys
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api.slow_queries import explain
+from recipes.management.commands.benchmark import get_git_commit
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from users.models import Follow, User
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stderr)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+
+def get_context():
+    """Объекты с наибольшим числом связей — худший случай для запросов."""
+    author = User.objects.order_by('-recipes_count', 'id').first()
+    follower = User.objects.annotate(
+        follows=Count('follower')
+    ).order_by('-follows', 'id').first()
+    ingredient = Ingredient.objects.order_by('id').first()
+    if author is None or follower is None or ingredient is None:
+        raise CommandError('В БД нет данных, запустите generate_data')
+    return {
+        'author': author,
+        'follower': follower,
+        'authors': list(User.objects.order_by('id').values_list(
+            'id', flat=True
+        )[:50]),
+        'prefix': ingredient.name[:2].upper(),
+    }
+
+
+def recipe_list(context):
+    return Recipe.objects.order_by('-pub_date', '-id')[:6]
+
+
+def author_recipes(context):
+    return Recipe.objects.filter(
+        author=context['author']
+    ).order_by('-pub_date', '-id')[:6]
+
+
+def subscribed_authors(context):
+    return Follow.objects.filter(
+        user=context['follower'], author_id__in=context['authors']
+    ).values_list('author_id', flat=True)
+
+
+def subscriptions(context):
+    return User.objects.filter(
+        following__user=context['follower']
+    ).order_by('id')[:6]
+
+
+def ingredient_prefix(context):
+    return Ingredient.objects.filter(
+        name__istartswith=context['prefix']
+    )[:10]
+
+
+def write_recipes(context, rows):
+    Recipe.objects.bulk_create(
+        Recipe(author=context['author'], name=f'benchmark {number}',
+               text='benchmark', cooking_time=1)
+        for number in range(rows)
+    )
+
+
+def write_follows(context, rows):
+    user_ids = list(
+        User.objects.order_by('id').values_list('id', flat=True)[:rows]
+    )
+    author_ids = user_ids[:10]
+    existing = set(Follow.objects.filter(
+        author_id__in=author_ids
+    ).values_list('user_id', 'author_id'))
+    Follow.objects.bulk_create(islice((
+        Follow(user_id=user_id, author_id=author_id)
+        for author_id in author_ids for user_id in user_ids
+        if user_id != author_id and (user_id, author_id) not in existing
+    ), rows))
+
+
+def write_ingredients(context, rows):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'benchmark {number}', measurement_unit='г')
+        for number in range(rows)
+    )
+
+
+# Индекс, таблица, запросы, которые он обслуживает, запись в таблицу,
+# чтобы видеть, во что он обходится при вставке, и внешний ключ, чей
+# индекс заменён составным: без составного индекса замер идёт с ним.
+INDEXES = (
+    ('recipe_pub_date_id_idx', Recipe, (recipe_list,), write_recipes, None),
+    ('recipe_author_pub_date_idx', Recipe, (author_recipes,),
+     write_recipes, 'author'),
+    ('follow_user_author_idx', Follow, (subscribed_authors, subscriptions),
+     write_follows, 'user'),
+    ('ingredient_name_upper_idx', Ingredient, (ingredient_prefix,),
+     write_ingredients, None),
+)
+# Избранное и корзина читаются по user_id вместе с recipe_id: это
+# покрывают уникальные ограничения (user, recipe), отдельный индекс
+# только замедлил бы запись.
+COVERED_BY_CONSTRAINTS = (
+    (Favorite, 'unique_favorite_recipe'),
+    (ShoppingCart, 'unique_recipe_in_shopping_cart'),
+)
+
+
+class Rollback(Exception):
+    """Откат транзакции после замера."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Планы и время запросов с индексами для горячих путей и без них, '
+        'а также стоимость вставки. Индекс удаляется внутри транзакции, '
+        'которая откатывается, но на время замера таблица блокируется — '
+        'запускайте на копии БД с данными generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--write-rows', type=int, default=500)
+        parser.add_argument(
+            '--index', action='append', dest='indexes',
+            help='Замерить только индексы с этими именами'
+        )
+        parser.add_argument('--output', help='Файл для результата')
+
+    def get_index_names(self, model):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            ))
+
+    def explain(self, queryset, phase):
+        # SQLite кэширует подготовленный EXPLAIN и не перестраивает его
+        # после DROP INDEX, поэтому текст запроса различается по фазам.
+        sql, params = queryset.query.sql_with_params()
+        return explain(connection, f'{sql} /* {phase} */', params)
+
+    def measure_queries(self, queries, context, iterations, phase):
+        results = {}
+        for query in queries:
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                list(query(context))
+                timings.append((time.perf_counter() - start) * 1000)
+            results[query.__name__] = {
+                'plan': self.explain(query(context), phase),
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+            }
+        return results
+
+    def measure_write(self, write, context, rows, repeats=5):
+        """Медиана времени вставки rows строк, вставка откатывается."""
+        timings = []
+        for _ in range(repeats):
+            try:
+                with transaction.atomic():
+                    start = time.perf_counter()
+                    write(context, rows)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    raise Rollback
+            except Rollback:
+                pass
+        return round(statistics.median(timings), 3)
+
+    def measure(self, queries, write, context, options, phase):
+        return {
+            'queries': self.measure_queries(
+                queries, context, options['iterations'], phase
+            ),
+            'write_ms': self.measure_write(
+                write, context, options['write_rows']
+            ),
+        }
+
+    def benchmark_index(self, name, model, replaced, queries, write,
+                        context, options):
+        with_index = self.measure(
+            queries, write, context, options, 'with_index'
+        )
+        quote_name = connection.ops.quote_name
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP INDEX {quote_name(name)}')
+                    if replaced:
+                        # Индекс внешнего ключа, как до составного индекса.
+                        column = model._meta.get_field(replaced).column
+                        cursor.execute(
+                            f'CREATE INDEX {quote_name(f"{name}_fk")} '
+                            f'ON {quote_name(model._meta.db_table)} '
+                            f'({quote_name(column)})'
+                        )
+                without_index = self.measure(
+                    queries, write, context, options, 'without_index'
+                )
+                raise Rollback
+        except Rollback:
+            pass
+        return {'without_index': without_index, 'with_index': with_index}
+
+    def handle(self, *args, indexes, output, **options):
+        context = get_context()
+        results = {}
+        for name, model, queries, write, replaced in INDEXES:
+            if indexes and name not in indexes:
+                continue
+            if name not in self.get_index_names(model):
+                logger.info(f'Индекса {name} нет в {connection.vendor}, '
+                            f'пропускаем')
+                results[name] = {'skipped': 'нет в этой базе данных'}
+                continue
+            logger.info(f'Замер индекса {name}')
+            results[name] = self.benchmark_index(
+                name, model, replaced, queries, write, context, options
+            )
+        for model, constraint in COVERED_BY_CONSTRAINTS:
+            results[constraint] = {
+                'covered_by_constraint': constraint in self.get_index_names(
+                    model
+                )
+            }
+
+        report = {
+            'commit': get_git_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'data': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'follows': Follow.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'indexes': results,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                file.write(content)
+            logger.info(f'Результат записан в {output}')
+        else:
+            self.stdout.write(content)
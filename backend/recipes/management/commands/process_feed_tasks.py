@@ -0,0 +1,64 @@
+import logging
+import sys
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.feed import refill_author_feeds
+from recipes.models import FeedRefillTask
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stdout)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = (
+        'Обработчик очереди заполнения лент подписчиков авторов, '
+        'которые перестали быть популярными'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать текущую очередь и завершиться'
+        )
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--sleep', type=float, default=5)
+
+    def handle(self, *args, once, max_attempts, sleep, **options):
+        while True:
+            processed = self.process_task(max_attempts)
+            if once and not processed:
+                break
+            if not processed:
+                time.sleep(sleep)
+
+    def process_task(self, max_attempts):
+        """
+        Выполняет одну задачу в своей транзакции: заполнение лент
+        популярного автора может быть долгим.
+        """
+        with transaction.atomic():
+            task = FeedRefillTask.objects.select_for_update(
+                skip_locked=True
+            ).filter(attempts__lt=max_attempts).first()
+            if task is None:
+                return False
+            try:
+                with transaction.atomic():
+                    refill_author_feeds(task)
+            except Exception:
+                logger.exception(f'Ошибка заполнения лент автора {task}')
+                task.attempts += 1
+                task.save(update_fields=['attempts'])
+            else:
+                task.delete()
+                logger.info(f'Заполнены ленты подписчиков автора {task}')
+        return True
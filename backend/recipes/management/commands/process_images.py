@@ -0,0 +1,73 @@
+import logging
+import sys
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.images import process_image_task
+from recipes.models import Recipe, RecipeImageTask
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stdout)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди подготовки картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать текущую очередь и завершиться'
+        )
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help='Поставить в очередь картинки рецептов без копий'
+        )
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--sleep', type=float, default=2)
+
+    def handle(self, *args, once, enqueue_missing, batch_size,
+               max_attempts, sleep, **options):
+        if enqueue_missing:
+            recipes = Recipe.objects.filter(image_variants={}).exclude(
+                image=''
+            ).values_list('id', 'image')
+            RecipeImageTask.objects.bulk_create(
+                RecipeImageTask(recipe_id=recipe_id, image=image)
+                for recipe_id, image in recipes.iterator()
+            )
+        while True:
+            processed = self.process_batch(batch_size, max_attempts)
+            if once and not processed:
+                break
+            if not processed:
+                time.sleep(sleep)
+
+    def process_batch(self, batch_size, max_attempts):
+        with transaction.atomic():
+            tasks = list(
+                RecipeImageTask.objects.select_for_update(
+                    skip_locked=True, of=('self',)
+                ).select_related('recipe').filter(
+                    attempts__lt=max_attempts
+                )[:batch_size]
+            )
+            for task in tasks:
+                try:
+                    with transaction.atomic():
+                        process_image_task(task)
+                except Exception:
+                    logger.exception(f'Ошибка обработки картинки {task}')
+                    task.attempts += 1
+                    task.save(update_fields=['attempts'])
+                else:
+                    task.delete()
+        return len(tasks)
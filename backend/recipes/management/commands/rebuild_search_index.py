@@ -0,0 +1,33 @@
+import logging
+import sys
+
+from django.core.management import BaseCommand
+
+from recipes.search import get_search_backend
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stdout)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Пересборка полнотекстового индекса рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        backend = get_search_backend()
+        if backend is None:
+            logger.warning('Поиск не поддерживается для этой базы данных')
+            return
+        logger.info(
+            f'Начата пересборка индекса: {type(backend).__name__}'
+        )
+        total = backend.rebuild(batch_size)
+        logger.info(f'Закончена пересборка индекса, рецептов: {total}')
@@ -0,0 +1,93 @@
+import logging
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, FeedRefillTask, Recipe, ShoppingCart
+from users.models import Follow, User
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(stream=sys.stdout)
+logger.addHandler(handler)
+formatter = logging.Formatter(
+    '%(asctime)s, [%(levelname)s] %(message)s'
+)
+handler.setFormatter(formatter)
+
+
+def count_subquery(model, field):
+    """Подзапрос количества строк model, ссылающихся на объект."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт денормализованных счётчиков рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        to_elaborate = [
+            {'model': Recipe,
+             'counters': {
+                 'favorites_count': count_subquery(Favorite, 'recipe'),
+                 'in_cart_count': count_subquery(ShoppingCart, 'recipe'),
+             },
+             'verbose_name': 'Рецепты'},
+            {'model': User,
+             'counters': {
+                 'recipes_count': count_subquery(Recipe, 'author'),
+                 'followers_count': count_subquery(Follow, 'author'),
+             },
+             'verbose_name': 'Пользователи'},
+        ]
+
+        for element in to_elaborate:
+            model = element['model']
+            verbose_name = element['verbose_name']
+            logger.info(f'Начался пересчёт счётчиков: {verbose_name}')
+            bounds = model.objects.aggregate(start=Min('pk'), end=Max('pk'))
+            if bounds['start'] is None:
+                continue
+            updated = 0
+            for start in range(bounds['start'], bounds['end'] + 1,
+                               batch_size):
+                with transaction.atomic():
+                    updated += model.objects.filter(
+                        pk__gte=start, pk__lt=start + batch_size
+                    ).update(**element['counters'])
+            logger.info(
+                f'Закончился пересчёт счётчиков: {verbose_name}, '
+                f'обработано {updated}'
+            )
+
+        # Флаг популярности зависит от числа подписчиков, которое
+        # могло измениться при пересчёте. Ленты авторов, переставших
+        # быть популярными, заполняет process_feed_tasks.
+        marked = User.objects.filter(
+            is_popular=False,
+            followers_count__gt=settings.FEED_POPULAR_AUTHOR_FOLLOWERS
+        ).update(is_popular=True)
+        tasks = FeedRefillTask.objects.bulk_create((
+            FeedRefillTask(author_id=author_id)
+            for author_id in User.objects.filter(
+                is_popular=True,
+                followers_count__lt=settings.FEED_REGULAR_AUTHOR_FOLLOWERS
+            ).values_list('id', flat=True)
+        ), ignore_conflicts=True)
+        logger.info(
+            f'Популярными стали {marked} авторов, поставлено задач '
+            f'заполнения лент: {len(tasks)}'
+        )
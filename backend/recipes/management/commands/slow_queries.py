@@ -0,0 +1,103 @@
+import json
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+SORT_FIELDS = ('total', 'count', 'max', 'mean')
+
+
+def read_records(path):
+    """Записи журнала медленных запросов, битые строки пропускаются."""
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def summarize(records):
+    """Группирует записи по отпечатку запроса."""
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'],
+            'count': 0,
+            'total': 0.0,
+            'max': 0.0,
+            'views': {},
+            'plan': None,
+            'last_seen': None,
+        })
+        duration = record['duration_ms']
+        group['count'] += 1
+        group['total'] += duration
+        group['max'] = max(group['max'], duration)
+        view = record.get('view') or '-'
+        group['views'][view] = group['views'].get(view, 0) + 1
+        group['last_seen'] = record['time']
+        if record.get('plan'):
+            group['plan'] = record['plan']
+    for group in groups.values():
+        group['mean'] = group['total'] / group['count']
+    return list(groups.values())
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных SQL-запросов: запросы с наибольшим '
+        'суммарным временем, представления, откуда они выполнены, '
+        'и последний сохранённый план'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=settings.SLOW_QUERY_LOG,
+            help='Файл журнала, по умолчанию SLOW_QUERY_LOG'
+        )
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--sort', choices=SORT_FIELDS, default='total')
+        parser.add_argument(
+            '--no-plans', action='store_true', help='Не выводить планы'
+        )
+        parser.add_argument(
+            '--json', action='store_true', dest='as_json',
+            help='Вывести сводку в JSON'
+        )
+
+    def handle(self, *args, file, limit, sort, no_plans, as_json,
+               **options):
+        if not file:
+            raise CommandError('Не задан файл журнала: укажите --file '
+                               'или настройку SLOW_QUERY_LOG')
+        try:
+            groups = summarize(read_records(file))
+        except FileNotFoundError:
+            raise CommandError(f'Файл {file} не найден')
+        groups.sort(key=lambda group: group[sort], reverse=True)
+        groups = groups[:limit]
+        if as_json:
+            self.stdout.write(json.dumps(groups, ensure_ascii=False, indent=2))
+            return
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
+            return
+        for number, group in enumerate(groups, 1):
+            self.stdout.write(
+                f'{number}. {group["count"]} раз, всего '
+                f'{group["total"]:.1f} мс, среднее {group["mean"]:.1f} мс, '
+                f'максимум {group["max"]:.1f} мс, '
+                f'последний {group["last_seen"]}'
+            )
+            self.stdout.write(f'   {group["fingerprint"]}')
+            views = sorted(
+                group['views'].items(), key=lambda item: -item[1]
+            )
+            self.stdout.write('   Представления: ' + ', '.join(
+                f'{view} ({count})' for view, count in views
+            ))
+            if group['plan'] and not no_plans:
+                self.stdout.write('   План:')
+                for line in group['plan']:
+                    self.stdout.write(f'     {line}')
+            self.stdout.write('')
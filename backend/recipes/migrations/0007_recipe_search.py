@@ -0,0 +1,75 @@
+# Generated by Django 3.2.20 on 2026-10-17 06:55
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+POSTGRES_INDEX = 'recipe_search_vector_idx'
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+
+
+INGREDIENT_NAMES = (
+    "SELECT {aggregate} FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        config = settings.RECIPE_SEARCH_CONFIG
+        ingredient_names = INGREDIENT_NAMES.format(
+            aggregate="string_agg(i.name, ' ')"
+        )
+        schema_editor.execute(
+            f"UPDATE recipes_recipe r SET search_vector = "
+            f"setweight(to_tsvector(%s, r.name), 'A') || "
+            f"setweight(to_tsvector(%s, r.text), 'B') || "
+            f"setweight(to_tsvector(%s, "
+            f"coalesce(({ingredient_names}), '')), 'C')",
+            (config, config, config)
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {POSTGRES_INDEX} ON recipes_recipe '
+            f'USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        ingredient_names = INGREDIENT_NAMES.format(
+            aggregate="group_concat(i.name, ' ')"
+        )
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} '
+            f'USING fts5(name, text, ingredients, '
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {SQLITE_FTS_TABLE} '
+            f'(rowid, name, text, ingredients) '
+            f"SELECT r.id, r.name, r.text, "
+            f"coalesce(({ingredient_names}), '') FROM recipes_recipe r"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {POSTGRES_INDEX}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.20 on 2026-10-17 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from foodgram.db.operations import AddIndexConcurrently
+
+NAME_PATTERN_INDEX = 'ingredient_name_upper_idx'
+
+
+def create_name_pattern_index(apps, schema_editor):
+    # istartswith на PostgreSQL — UPPER(name) LIKE UPPER(%s), такой
+    # индекс Django 3.2 не умеет описать через Meta.indexes.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {NAME_PATTERN_INDEX} '
+            f'ON recipes_ingredient '
+            f'(UPPER(name) varchar_pattern_ops)'
+        )
+
+
+def drop_name_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'DROP INDEX CONCURRENTLY IF EXISTS {NAME_PATTERN_INDEX}'
+        )
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, без блокировки записи в таблицы,
+    # а это невозможно внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_feedentry'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.RunPython(
+            create_name_pattern_index, drop_name_pattern_index,
+            atomic=False
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.20 on 2026-10-17 07:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedRefillTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Количество попыток')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed_refill_task', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Заполнение лент',
+                'verbose_name_plural': 'Заполнение лент',
+                'ordering': ['created', 'id'],
+            },
+        ),
+    ]
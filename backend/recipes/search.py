@@ -0,0 +1,184 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from recipes.models import Recipe, RecipeIngredient
+
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+
+
+class BaseSearchBackend:
+    """
+    Полнотекстовый поиск рецептов по названию, описанию
+    и названиям ингредиентов.
+    """
+    def update(self, recipe_ids):
+        """Обновляет поисковый индекс для рецептов recipe_ids."""
+        raise NotImplementedError
+
+    def remove(self, recipe_ids):
+        """Удаляет рецепты recipe_ids из поискового индекса."""
+
+    def rank(self, queryset, query):
+        """
+        Оставляет в queryset найденные рецепты и добавляет
+        аннотацию search_rank: чем больше, тем релевантнее.
+        """
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        if not query.split():
+            return queryset
+        return self.rank(queryset, query).order_by(
+            '-search_rank', '-pub_date', '-id'
+        )
+
+    def rebuild(self, batch_size):
+        """Пересобирает индекс для всех рецептов пачками."""
+        return self.update_in_batches(
+            Recipe.objects.order_by('id').values_list('id', flat=True),
+            batch_size
+        )
+
+    def update_in_batches(self, recipe_ids, batch_size):
+        """Обновляет индекс для queryset id рецептов пачками."""
+        batch = []
+        total = 0
+        for recipe_id in recipe_ids.iterator(chunk_size=batch_size):
+            batch.append(recipe_id)
+            if len(batch) >= batch_size:
+                self.update(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.update(batch)
+            total += len(batch)
+        return total
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Поиск по хранимому в Recipe.search_vector tsvector с GIN-индексом.
+    Веса: название — A, описание — B, ингредиенты — C.
+    """
+    def update(self, recipe_ids):
+        config = settings.RECIPE_SEARCH_CONFIG
+        ingredient_names = Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(names=StringAgg('ingredient__name', delimiter=' '))
+            .values('names')
+        )
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=(
+                SearchVector('name', weight='A', config=config)
+                + SearchVector('text', weight='B', config=config)
+                + SearchVector(
+                    Coalesce(ingredient_names, Value('')),
+                    weight='C', config=config
+                )
+            )
+        )
+
+    def rank(self, queryset, query):
+        search_query = SearchQuery(
+            query, config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Поиск через виртуальную таблицу FTS5, rowid которой
+    совпадает с id рецепта. Нужен для локальной разработки.
+    """
+    def update(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        names = {}
+        for recipe_id, name in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient__name'):
+            names.setdefault(recipe_id, []).append(name)
+        rows = [
+            (recipe['id'], recipe['name'], recipe['text'],
+             ' '.join(names.get(recipe['id'], [])))
+            for recipe in Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values('id', 'name', 'text')
+        ]
+        self.remove(recipe_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_FTS_TABLE} '
+                f'(rowid, name, text, ingredients) VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+    def remove(self, recipe_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s',
+                [(recipe_id,) for recipe_id in recipe_ids]
+            )
+
+    def get_match_expression(self, query):
+        """Каждое слово запроса ищется как префикс, слова объединяются И."""
+        return ' '.join(
+            '"{}"*'.format(term.replace('"', '""')) for term in query.split()
+        )
+
+    def rank(self, queryset, query):
+        match = self.get_match_expression(query)
+        table = connection.ops.quote_name(SQLITE_FTS_TABLE)
+        recipe_id = '{}.{}'.format(
+            connection.ops.quote_name(Recipe._meta.db_table),
+            connection.ops.quote_name('id')
+        )
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({table}, 10.0, 5.0, 1.0) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid = {recipe_id}',
+            (match,), output_field=FloatField()
+        ))
+
+
+def get_search_backend():
+    backend = settings.RECIPE_SEARCH_BACKEND
+    if backend:
+        return import_string(backend)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return None
+
+
+def update_search_index(recipe_ids):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.update(recipe_ids)
+
+
+def update_ingredient_recipes(ingredient_id):
+    """
+    Обновляет индекс рецептов с ингредиентом: его название
+    входит в поисковый индекс рецепта.
+    """
+    backend = get_search_backend()
+    if backend is not None:
+        backend.update_in_batches(
+            RecipeIngredient.objects.filter(ingredient_id=ingredient_id)
+            .order_by('recipe_id').values_list('recipe_id', flat=True)
+            .distinct(),
+            settings.RECIPE_SEARCH_BATCH_SIZE
+        )
@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'))
+
+
+def get_recipes_amounts(recipe_ids):
+    """Суммарное количество каждого ингредиента в нескольких рецептах."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient_id').annotate(
+        total_amount=Sum('amount')
+    ).order_by().values_list('ingredient_id', 'total_amount'))
+
+
+def get_amounts_delta(old_amounts, new_amounts):
+    """Разница количеств ингредиентов между двумя составами рецепта."""
+    delta = Counter(new_amounts)
+    delta.subtract(old_amounts)
+    return {
+        ingredient_id: amount
+        for ingredient_id, amount in delta.items() if amount
+    }
+
+
+def change_shopping_lists(user_ids, delta):
+    """
+    Изменяет списки покупок пользователей user_ids на delta —
+    словарь {ingredient_id: изменение количества}.
+    Существующие строки меняются одним UPDATE сразу
+    для всех пользователей и ингредиентов.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+    items.filter(ingredient_id__in=delta).update(
+        total_amount=Greatest(
+            F('total_amount') + Case(
+                *(When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in delta.items()),
+                output_field=IntegerField()
+            ),
+            0
+        )
+    )
+    added = [
+        ingredient_id for ingredient_id, amount in delta.items() if amount > 0
+    ]
+    if added:
+        existing = set(items.filter(ingredient_id__in=added).values_list(
+            'user_id', 'ingredient_id'
+        ))
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=delta[ingredient_id]
+            )
+            for user_id in user_ids
+            for ingredient_id in added
+            if (user_id, ingredient_id) not in existing
+        ])
+    if len(added) < len(delta):
+        items.filter(total_amount=0).delete()
+
+
+def change_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в списки покупок."""
+    change_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True),
+        get_amounts_delta(old_amounts, new_amounts)
+    )
+
+
+def get_live_shopping_list(user_id):
+    """Список покупок, посчитанный по корзине пользователя."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user_id=user_id
+    ).values('ingredient_id').annotate(
+        total_amount=Sum('amount')
+    ).order_by().values_list('ingredient_id', 'total_amount'))
+
+
+def rebuild_shopping_list(user_id):
+    """Пересобирает список покупок пользователя по его корзине."""
+    ShoppingListItem.objects.filter(user_id=user_id).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id,
+            ingredient_id=ingredient_id,
+            total_amount=total_amount
+        )
+        for ingredient_id, total_amount
+        in get_live_shopping_list(user_id).items()
+    )
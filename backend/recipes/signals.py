@@ -0,0 +1,152 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.feed import backfill_feed, fan_out_recipe, trim_feed
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.search import get_search_backend, update_ingredient_recipes
+from recipes.shopping_list import change_shopping_lists, get_recipe_amounts
+from recipes.versions import bump_version
+from users.counters import update_counter
+from users.models import Follow, User
+
+CATALOG_VERSIONS = {
+    Ingredient: 'ingredients',
+    Tag: 'tags',
+}
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_cart_count',
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_catalog_version(sender, **kwargs):
+    """Обновляет версию справочника после его изменения."""
+    bump_version(CATALOG_VERSIONS[sender])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search(sender, instance, created, update_fields,
+                             **kwargs):
+    """Название ингредиента входит в поисковый индекс рецептов с ним."""
+    if created or (update_fields and 'name' not in update_fields):
+        return
+    transaction.on_commit(lambda: update_ingredient_recipes(instance.pk))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increase_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrease_recipe_counter(sender, instance, **kwargs):
+    update_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    update_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+def update_feeds(sender, instance, created, **kwargs):
+    """
+    Новый рецепт раскладывается по лентам подписчиков, а у изменённого
+    обновляется дата публикации, от которой зависит порядок ленты.
+    """
+    if created:
+        fan_out_recipe(instance)
+    else:
+        FeedEntry.objects.filter(recipe=instance).update(
+            pub_date=instance.pub_date
+        )
+
+
+@receiver(post_save, sender=Follow)
+def add_to_feed(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_feed(sender, instance, **kwargs):
+    trim_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        change_shopping_lists(
+            [instance.user_id], get_recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """
+    Вызывается до удаления, чтобы при каскадном удалении рецепта
+    его ингредиенты ещё были доступны.
+    """
+    change_shopping_lists([instance.user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount
+        in get_recipe_amounts(instance.recipe_id).items()
+    })
+
+
+def bump_version_on_commit(name):
+    """
+    Версия меняется после фиксации транзакции, чтобы в кэш
+    не попало представление, собранное по старым данным.
+    """
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_version_on_commit(f'recipe:{instance.id}')
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    bump_version_on_commit(f'recipe:{instance.recipe_id}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        bump_version_on_commit('tags')
+    else:
+        bump_version_on_commit(f'recipe:{instance.id}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, update_fields, **kwargs):
+    """Вход пользователя меняет только last_login, его не учитываем."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_version_on_commit(f'user:{instance.id}')
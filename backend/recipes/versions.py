@@ -0,0 +1,54 @@
+import time
+
+from django.core.cache import caches
+
+VERSION_KEY = 'version:{}'
+
+# Версии хранятся в отдельном кэше, общем для всех процессов
+# и контейнеров, включая обработчик картинок.
+cache = caches['versions']
+
+
+def get_version(name):
+    """
+    Возвращает текущую версию набора данных name.
+    Начальная версия зависит от времени, чтобы после очистки
+    кэша не повторились уже выданные версии.
+    """
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        initial = time.time_ns()
+        cache.add(key, initial, None)
+        # Кэш может вытеснить ключ сразу после add().
+        version = cache.get(key, initial)
+    return version
+
+
+def bump_version(name):
+    """Увеличивает версию набора данных name."""
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def get_versions(names):
+    """Возвращает версии нескольких наборов данных за одно обращение."""
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        initial = {key: time.time_ns() for key in missing}
+        for key, version in initial.items():
+            cache.add(key, version, None)
+        added = cache.get_many(missing)
+        # Кэш может вытеснить ключи сразу после add(), тогда
+        # используется значение, которое пытались записать.
+        versions.update(
+            (key, added.get(key, version)) for key, version in initial.items()
+        )
+    return {keys[key]: version for key, version in versions.items()}
@@ -0,0 +1,20 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+def update_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет счётчик field объекта model на delta
+    одним UPDATE, не опуская значение ниже нуля.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def update_counters(model, pks, field, delta):
+    """Изменяет счётчик field сразу у нескольких объектов одним UPDATE."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.20 on 2026-10-17 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from foodgram.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Индекс строится CONCURRENTLY, без блокировки записи в таблицу,
+    # а это невозможно внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='follow',
+            index=models.Index(fields=['user', 'author'], name='follow_user_author_idx'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.20 on 2026-10-17 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular_authors(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.filter(
+        followers_count__gt=settings.FEED_POPULAR_AUTHOR_FOLLOWERS
+    ).update(is_popular=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_follow_user_author_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_popular',
+            field=models.BooleanField(default=False, editable=False, help_text='Рецепты автора не раскладываются по лентам подписчиков', verbose_name='Популярный автор'),
+        ),
+        migrations.RunPython(
+            mark_popular_authors, migrations.RunPython.noop
+        ),
+    ]
@@ -39,6 +39,22 @@ class User(AbstractUser):
         blank=False,
         null=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    is_popular = models.BooleanField(
+        verbose_name='Популярный автор',
+        default=False,
+        editable=False,
+        help_text='Рецепты автора не раскладываются по лентам подписчиков',
+    )
 
     class Meta:
         ordering = ['id']
@@ -60,7 +76,9 @@ class Follow(models.Model):
         User,
         related_name='follower',
         verbose_name='Подписчик',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        # Поиск по подписчику обслуживает follow_user_author_idx.
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -78,6 +96,12 @@ class Follow(models.Model):
                 name='unique_follower'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='follow_user_author_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Автор: {self.author}, подписчик: {self.user}'
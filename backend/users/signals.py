@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.feed import mark_popular, request_feed_refill
+from users.counters import update_counter
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+def increase_followers_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, instance.author_id, 'followers_count', 1)
+        mark_popular(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def decrease_followers_count(sender, instance, **kwargs):
+    update_counter(User, instance.author_id, 'followers_count', -1)
+    request_feed_refill(instance.author_id)